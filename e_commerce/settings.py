@@ -66,6 +66,23 @@ REST_FRAMEWORK = {
 }
 
 
+# ! Cache
+# ? the catalog response cache and its version counters live here, point it at
+# ? a shared backend (redis/memcached) when running more than one worker
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+CATALOG_CACHE_TIMEOUT = 60 * 15
+WISHLIST_CACHE_TIMEOUT = 60 * 60
+CART_CACHE_TIMEOUT = 60 * 60
+GUEST_CART_TIMEOUT = 60 * 60 * 24 * 7
+# ? best matching products a ?search= keeps, the result count and the facet
+# ? counts only cover these. None keeps every match
+SEARCH_RESULT_LIMIT = 500
+
+
 # ! Necessary for dj_rest_auth to work
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
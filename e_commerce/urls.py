@@ -19,6 +19,7 @@ router.register('api/brand', views.Brand)
 router.register('api/review', views.ReviewView)
 router.register('api/wishlist', views.WishlistView)
 router.register('api/cart', views.CartView)
+router.register('api/guest-cart', views.GuestCartView, basename='guest-cart')
 router.register('api/order', views.OrderView)
 router.register('api/user', views.UserView)
 
@@ -23,6 +23,7 @@ from .models import (
     WishlistItem,
     Review,
     ProductFeature,
+    ProductCard,
 )
 from users.models import ShippingAddress, User
 
@@ -257,3 +258,19 @@ class WishlistItemAdmin(admin.ModelAdmin):
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
     list_display = ('id', 'rating', 'comment', 'user', 'product')
+
+
+@admin.register(ProductCard)
+class ProductCardAdmin(admin.ModelAdmin):
+    list_display = (
+        'product',
+        'name',
+        'min_price',
+        'max_price',
+        'default_sku',
+        'in_stock',
+        'category_path',
+        'refreshed_at',
+    )
+    list_filter = ('in_stock',)
+    search_fields = ('name', 'default_sku')
@@ -0,0 +1,143 @@
+import threading
+import time
+from collections import defaultdict
+from django.db.models import Q, Sum
+from django.db.models.functions import Coalesce
+from inventory import models
+from inventory.catalog_cache import get_versions
+from inventory.search import tokenize
+
+
+# ! suggestions kept on every trie node, the most a request can ask for
+SUGGESTION_LIMIT = 10
+
+
+class PrefixIndex:
+    """
+    Trie over normalized suggestion texts where every node keeps the best
+    `limit` suggestions below it, so a lookup is a walk down the prefix and
+    costs the same whatever the size of the catalog.
+
+    Every word of a text starts a path of its own: "wool jumper" is reached
+    from "wo" as well as from "ju".
+    """
+
+    def __init__(self, entries, limit=SUGGESTION_LIMIT):
+        # ! entries: [(weight, text, suggestion)]
+        self.limit = limit
+        self.root = {}
+        # ? inserting the heaviest entries first fills every node's list in
+        # ? ranking order, no node is ever re-sorted
+        for weight, text, suggestion in sorted(entries, key=lambda entry: (-entry[0], entry[1])):
+            words = tokenize(text)
+            for start in range(len(words)):
+                self.insert(' '.join(words[start:]), suggestion)
+
+    def insert(self, key, suggestion):
+        node = self.root
+        for char in key:
+            node = node.setdefault(char, {})
+            top = node.setdefault(None, [])
+            if len(top) < self.limit and suggestion not in top:
+                top.append(suggestion)
+
+    def lookup(self, prefix, limit=None):
+        node = self.root
+        for char in ' '.join(tokenize(prefix)):
+            node = node.get(char)
+            if node is None:
+                return []
+        return node.get(None, [])[:limit or self.limit]
+
+
+class CatalogAutocomplete:
+    """
+    Process-wide PrefixIndex over product, brand and category names weighted
+    by units sold. It is rebuilt from four queries whenever one of the
+    catalog versions it depends on has moved, and at most every
+    `popularity_refresh` seconds otherwise so the weights follow sales
+    without every stock write forcing a rebuild.
+
+    A rebuild runs in one request at a time, the others keep answering from
+    the previous index meanwhile.
+    """
+    cache_models = [
+        models.Product,
+        models.Brand,
+        models.Category,
+    ]
+    popularity_refresh = 60 * 15
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.index = None
+        self.versions = None
+        self.built_at = None
+
+    def build(self):
+        products = models.Product.objects.filter(is_active=True).annotate(
+            popularity=Coalesce(Sum(
+                'inventories__stock__units_sold',
+                filter=Q(inventories__is_active=True),
+            ), 0)
+        ).values_list('pk', 'name', 'slug', 'brand_id', 'popularity')
+
+        entries = []
+        popularity = {}
+        brand_popularity = defaultdict(int)
+        for pk, name, slug, brand_id, units_sold in products:
+            popularity[pk] = units_sold
+            brand_popularity[brand_id] += units_sold
+            entries.append((units_sold, name, {
+                'type': 'product', 'id': pk, 'name': name, 'slug': slug}))
+
+        for pk, name in models.Brand.objects.values_list('pk', 'name'):
+            entries.append((brand_popularity[pk], name, {
+                'type': 'brand', 'id': pk, 'name': name, 'slug': None}))
+
+        category_popularity = defaultdict(int)
+        for category_id, product_id in models.Product.category.through.objects.values_list(
+                'category_id', 'product_id'):
+            category_popularity[category_id] += popularity.get(product_id, 0)
+        for pk, name, slug in models.Category.objects.filter(
+                is_active=True).values_list('pk', 'name', 'slug'):
+            entries.append((category_popularity[pk], name, {
+                'type': 'category', 'id': pk, 'name': name, 'slug': slug}))
+
+        return PrefixIndex(entries)
+
+    def is_stale(self, versions):
+        return (
+            self.index is None
+            or versions != self.versions
+            or time.monotonic() - self.built_at > self.popularity_refresh
+        )
+
+    def sync(self):
+        versions = get_versions(self.cache_models)
+        if not self.is_stale(versions):
+            return
+        # ? only the very first build is waited for, afterwards a request
+        # ? finding a rebuild under way serves the index it already has
+        if not self.lock.acquire(blocking=self.index is None):
+            return
+        try:
+            if self.is_stale(versions):
+                self.index = self.build()
+                self.versions = versions
+                self.built_at = time.monotonic()
+        finally:
+            self.lock.release()
+
+    def reset(self):
+        with self.lock:
+            self.index = None
+            self.versions = None
+            self.built_at = None
+
+    def suggest(self, prefix, limit=None):
+        self.sync()
+        return self.index.lookup(prefix, limit)
+
+
+catalog_autocomplete = CatalogAutocomplete()
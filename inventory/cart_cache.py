@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.cache import cache
+from inventory import models
+
+
+# ! the number of items in a user's cart, held in the cache for the cart
+# ! badge shown on every page
+
+def cart_cache_key(user_id):
+    return f"cart:items_count:{user_id}"
+
+
+def get_cart_items_count(user):
+    if not (user and user.is_authenticated):
+        return 0
+    key = cart_cache_key(user.pk)
+    count = cache.get(key)
+    if count is None:
+        count = models.CartItem.objects.filter(cart__user=user).count()
+        cache.set(key, count, settings.CART_CACHE_TIMEOUT)
+    return count
+
+
+def set_cart_items_count(user_id, count):
+    cache.set(cart_cache_key(user_id), count, settings.CART_CACHE_TIMEOUT)
+
+
+def invalidate_cart(user_id):
+    cache.delete(cart_cache_key(user_id))
+
+
+# ! the attribute value ids of each inventory, held in the cache so adding to
+# ! the cart validates the chosen attributes without loading the M2M
+
+def inventory_attributes_cache_key(inventory_id):
+    return f"inventory:attribute_ids:{inventory_id}"
+
+
+def get_inventory_attribute_ids(inventory_ids):
+    # ! {inventory id: set of attribute value ids}, one query for the misses
+    keys = {inventory_attributes_cache_key(pk): pk for pk in inventory_ids}
+    cached = cache.get_many(keys)
+    attribute_ids = {keys[key]: value for key, value in cached.items()}
+    missing = [pk for pk in inventory_ids if pk not in attribute_ids]
+    if missing:
+        loaded = {pk: set() for pk in missing}
+        for inventory_id, value_id in models.ProductInventory.attribute_values.through.objects.filter(
+            productinventory_id__in=missing
+        ).values_list('productinventory_id', 'productattributevalue_id'):
+            loaded[inventory_id].add(value_id)
+        cache.set_many(
+            {inventory_attributes_cache_key(pk): value for pk, value in loaded.items()},
+            settings.CATALOG_CACHE_TIMEOUT)
+        attribute_ids.update(loaded)
+    return attribute_ids
+
+
+def invalidate_inventory_attributes(inventory_ids):
+    cache.delete_many([inventory_attributes_cache_key(pk) for pk in inventory_ids])
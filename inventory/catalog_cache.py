@@ -0,0 +1,106 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.response import Response
+
+
+# ! VERSION COUNTERS
+# ? every catalog model has a counter in the cache, cached responses embed the
+# ? counters of the models they were built from so a write only has to bump
+# ? one counter to make every dependent response unreachable.
+# ? counters start from the clock so a counter lost to eviction never comes
+# ? back with a value an older response was stored under.
+
+def version_key(model):
+    return f"catalog:version:{model._meta.label_lower}"
+
+
+def get_versions(models):
+    keys = [version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def versions_digest(models):
+    # ? one fixed length token for all the counters, keys stay short enough
+    # ? for memcached however many models a response depends on
+    versions = ':'.join(str(version) for version in get_versions(models))
+    return hashlib.md5(versions.encode()).hexdigest()
+
+
+def bump_version(model):
+    try:
+        cache.incr(version_key(model))
+    except ValueError:
+        cache.set(version_key(model), time.time_ns(), timeout=None)
+
+
+class CatalogCacheMixin:
+    """
+    Caches the GET responses of a viewset under its normalized url and the
+    versions of `cache_models`.
+
+    The cached body must be the same for every user: per-user fields are
+    applied by `personalize()` to every response, cached or freshly built.
+    """
+    # ! models whose writes invalidate this viewset's cached responses
+    cache_models = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, super().retrieve, *args, **kwargs)
+
+    def get_cache_key(self, request):
+        query = sorted(
+            (key, value)
+            for key, values in request.query_params.lists()
+            for value in values
+        )
+        url = f"{request.get_host()}{request.path}?{urlencode(query)}"
+        versions = versions_digest(self.cache_models)
+        return f"catalog:response:{hashlib.md5(url.encode()).hexdigest()}:{versions}"
+
+    def cached_response(self, request, view, *args, **kwargs):
+        key = self.get_cache_key(request)
+        data = cache.get(key)
+        if data is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            data = response.data
+            cache.set(key, data, settings.CATALOG_CACHE_TIMEOUT)
+        return Response(self.personalize(request, data))
+
+    def personalize(self, request, data):
+        return data
+
+
+# ! CONDITIONAL GET
+def conditional_response(request, view, etag, last_modified=None, *args, **kwargs):
+    """
+    Answers 304 when the request's If-None-Match/If-Modified-Since match the
+    given validators, without calling `view`. Otherwise returns the view's
+    response stamped with them.
+    """
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(
+        request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = view(request, *args, **kwargs)
+        if response.status_code != status.HTTP_200_OK:
+            return response
+    response['ETag'] = etag
+    if timestamp is not None:
+        response['Last-Modified'] = http_date(timestamp)
+    return response
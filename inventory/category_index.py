@@ -0,0 +1,80 @@
+import threading
+from collections import namedtuple
+from inventory import models
+from inventory.catalog_cache import get_versions
+
+
+CategoryNode = namedtuple('CategoryNode', [
+    'id', 'name', 'slug', 'is_active', 'parent_id', 'tree_id', 'lft', 'rght', 'level', 'position',
+])
+
+
+class CategoryTreeIndex:
+    """
+    Every category in MPTT tree order, addressable by id and slug.
+
+    In tree order a category is directly followed by its descendants, so the
+    subtree of a node is the slice of `(rght - lft + 1) / 2` nodes starting at
+    its own position.
+    """
+
+    def __init__(self, rows):
+        self.nodes = [
+            CategoryNode(*row, position=position) for position, row in enumerate(rows)
+        ]
+        self.by_id = {node.id: node for node in self.nodes}
+        self.by_slug = {node.slug: node for node in self.nodes}
+
+    def get(self, slug):
+        return self.by_slug.get(slug)
+
+    def subtree(self, node):
+        # ? the node itself followed by all of its descendants
+        return self.nodes[node.position:node.position + (node.rght - node.lft + 1) // 2]
+
+    def descendant_ids(self, node, include_self=True):
+        nodes = self.subtree(node)
+        return [descendant.id for descendant in (nodes if include_self else nodes[1:])]
+
+    def ancestors(self, node, include_self=False):
+        # ! root first
+        chain = [node] if include_self else []
+        while node.parent_id is not None:
+            node = self.by_id[node.parent_id]
+            chain.append(node)
+        return chain[::-1]
+
+
+class CategoryIndex:
+    """
+    Process-wide CategoryTreeIndex, reloaded with a single query whenever the
+    Category version counter has moved (every category save or delete bumps
+    it, see signals.handler).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tree = None
+        self.version = None
+
+    def load(self):
+        return CategoryTreeIndex(models.Category.objects.order_by('tree_id', 'lft').values_list(
+            'id', 'name', 'slug', 'is_active', 'parent_id', 'tree_id', 'lft', 'rght', 'level',
+        ))
+
+    def get(self):
+        version = get_versions([models.Category])[0]
+        if self.tree is None or version != self.version:
+            with self.lock:
+                if self.tree is None or version != self.version:
+                    self.tree = self.load()
+                    self.version = version
+        return self.tree
+
+    def reset(self):
+        with self.lock:
+            self.tree = None
+            self.version = None
+
+
+category_index = CategoryIndex()
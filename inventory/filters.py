@@ -1,6 +1,12 @@
+from django.conf import settings
 from django_filters import rest_framework as filters
+from rest_framework.filters import SearchFilter
 from inventory import models
-from django.db.models import Q, F, Count, Avg, Max, Min, Sum
+from inventory.search import catalog_search
+from inventory.category_index import category_index
+from django.db.models import (
+    Q, F, Count, Avg, Max, Min, Sum, Case, When, Value, IntegerField, Exists, OuterRef
+)
 
 
 
@@ -35,17 +41,54 @@ class ProductFilter(filters.FilterSet):
     )
 
     def filter_rating(self, queryset, name, value):
-        return queryset.filter(Q(reviews__rating=value))
+        # ? products with at least one review of the given star,
+        # ? read from the stored histogram instead of joining reviews
+        if not value.isdigit() or int(value) not in models.RATING_STARS:
+            return queryset.none()
+        return queryset.filter(**{f'rating_{value}_count__gt': 0})
 
     def filter_brand(self, queryset, name, value):
         brand_names = value.split(',')
         return queryset.filter(Q(brand__name__in=brand_names))
 
     def filter_category_slug(self, queryset, name, value):
-        category = models.Category.objects.get(slug=value)
-        # ? include self
-        # ? because if theres no descendants,
-        # ? we want to include the parent and query the parent
-        descendant_slugs = category.get_descendants(
-            include_self=True).values_list('slug', flat=True)
-        return queryset.filter(Q(category__slug__in=descendant_slugs))
+        # ! the category and its descendants are one lft range of one tree,
+        # ! resolved from the in-memory category index: no lookup queries and
+        # ! no slug list, a single EXISTS over the product/category links
+        category = category_index.get().get(value)
+        if category is None:
+            return queryset.none()
+        return queryset.filter(Exists(
+            models.Product.category.through.objects.filter(
+                product_id=OuterRef('pk'),
+                category__tree_id=category.tree_id,
+                category__lft__range=(category.lft, category.rght),
+            )
+        ))
+
+
+class ProductSearchFilter(SearchFilter):
+    # ! ?search= is answered by the in-process BM25 index (inventory.search),
+    # ! the product query is only narrowed down to the best matching ids:
+    # ! at most settings.SEARCH_RESULT_LIMIT of them, which also bounds the
+    # ! result count and the facet counts of a search
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        product_ids = [
+            product_id for product_id, _ in catalog_search.search(query, settings.SEARCH_RESULT_LIMIT)
+        ]
+        if not product_ids:
+            return queryset.none()
+        queryset = queryset.filter(pk__in=product_ids)
+        # ? an explicit ProductFilter sort wins over relevance
+        if 'sort' in request.query_params:
+            return queryset
+        return queryset.annotate(
+            search_rank=Case(
+                *[When(pk=product_id, then=Value(rank))
+                  for rank, product_id in enumerate(product_ids)],
+                output_field=IntegerField(),
+            )
+        ).order_by('search_rank')
@@ -0,0 +1,93 @@
+from decimal import Decimal
+from uuid import uuid4
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from inventory import models
+from inventory.serializers.cart_serializers import BulkAddCartItemSerializer
+
+
+# ! GUEST CARTS
+# ? anonymous shoppers get a signed token instead of a Cart row, their lines
+# ? live in the cache under it until they expire or are merged into the
+# ? user's cart at login, so browsing and adding write nothing to the database
+
+GUEST_CART_HEADER = 'X-Guest-Cart'
+# ? a guest cart has to fit in one bulk add when it is merged
+GUEST_CART_MAX_LINES = 100
+signer = signing.Signer(salt='inventory.guest_cart')
+
+
+def new_guest_token():
+    return signer.sign(uuid4().hex)
+
+
+def guest_cart_key(token):
+    # ! None for a missing or tampered token
+    if not token:
+        return None
+    try:
+        return f"guest_cart:{signer.unsign(token)}"
+    except signing.BadSignature:
+        return None
+
+
+def get_guest_token(request):
+    return request.headers.get(GUEST_CART_HEADER)
+
+
+def get_guest_lines(token):
+    key = guest_cart_key(token)
+    return cache.get(key, {}) if key else {}
+
+
+def guest_line_key(key):
+    # ? the cache key of a line resolved by resolve_cart_lines()
+    inventory_id, signature, unit_price = key
+    return f"{inventory_id}|{signature}|{unit_price}"
+
+
+def add_guest_line(token, key, quantity):
+    # ! adds a line resolved by resolve_cart_lines(), merging it with an equal
+    # ! selection already in the guest cart, and returns the lines
+    inventory_id, signature, unit_price = key
+    if unit_price is None:
+        # ? the line could never be summed or merged
+        raise ValueError('A guest cart line needs a unit price.')
+    lines = get_guest_lines(token)
+    line = lines.setdefault(guest_line_key(key), {
+        'product_inventory': inventory_id,
+        'attribute_values': [int(pk) for pk in signature.split(',') if pk],
+        'unit_price': str(unit_price),
+        'quantity': 0,
+    })
+    line['quantity'] += quantity
+    cache.set(guest_cart_key(token), lines, settings.GUEST_CART_TIMEOUT)
+    return lines
+
+
+def summarize_guest_cart(token, lines):
+    return {
+        'token': token,
+        'items': list(lines.values()),
+        'items_count': len(lines),
+        'cart_total_price': sum(
+            (Decimal(line['unit_price']) * line['quantity'] for line in lines.values()),
+            Decimal(0),
+        ),
+    }
+
+
+def merge_guest_cart(user, token):
+    # ! moves the guest lines into the user's cart with one bulk add, the
+    # ! guest cart is dropped once they are written. None without guest lines
+    lines = get_guest_lines(token)
+    if not lines:
+        return None
+    cart = models.Cart.objects.for_user(user)
+    serializer = BulkAddCartItemSerializer(
+        data={'items': list(lines.values())}, context={'cart_pk': cart.pk})
+    serializer.is_valid(raise_exception=True)
+    results = serializer.save()
+    cache.delete(guest_cart_key(token))
+    return results
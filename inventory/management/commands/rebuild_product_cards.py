@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from inventory.models import ProductCard
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the denormalized product card of every active product'
+
+    def handle(self, *args, **kwargs):
+        ProductCard.objects.refresh()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {ProductCard.objects.count()} product cards'))
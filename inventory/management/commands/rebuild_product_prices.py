@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from inventory.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored min/max price of every product from its active inventories'
+
+    def handle(self, *args, **kwargs):
+        count = Product.objects.all().refresh_prices()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt prices for {count} products'))
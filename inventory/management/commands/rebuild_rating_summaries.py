@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from inventory.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored rating summary of every product from its reviews'
+
+    def handle(self, *args, **kwargs):
+        count = Product.objects.all().rebuild_rating_summary()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt rating summaries for {count} products'))
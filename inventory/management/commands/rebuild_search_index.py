@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from inventory.catalog_cache import bump_version
+from inventory.models import ProductSearchDocument
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the search document of every product'
+
+    def handle(self, *args, **kwargs):
+        ProductSearchDocument.objects.refresh()
+        # ? running processes pick the new documents up on their next search
+        bump_version(ProductSearchDocument)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {ProductSearchDocument.objects.count()} search documents'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from inventory.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the stored variant matrix of every product'
+
+    def handle(self, *args, **kwargs):
+        count = Product.objects.all().refresh_variant_matrix()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt variant matrices for {count} products'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from inventory.models import CartItem
+
+
+class Command(BaseCommand):
+    help = 'Align the unit price of every cart line with the current sale price of its inventory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **kwargs):
+        count = CartItem.objects.reprice(batch_size=kwargs['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Repriced {count} cart lines'))
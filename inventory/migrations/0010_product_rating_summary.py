@@ -0,0 +1,80 @@
+# Generated by Django 4.1.6 on 2026-10-18 12:59
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def populate_rating_summary(apps, schema_editor):
+    Product = apps.get_model("inventory", "Product")
+    Review = apps.get_model("inventory", "Review")
+    summaries = (
+        Review.objects.order_by()
+        .values("product")
+        .annotate(
+            count=Count("pk"),
+            total=Sum("rating"),
+            **{
+                f"stars_{star}": Count("pk", filter=Q(rating=star))
+                for star in range(1, 6)
+            },
+        )
+    )
+    for summary in summaries:
+        Product.objects.filter(pk=summary["product"]).update(
+            rating_count=summary["count"],
+            rating_sum=summary["total"],
+            rating_avg=summary["total"] / summary["count"],
+            **{
+                f"rating_{star}_count": summary[f"stars_{star}"] for star in range(1, 6)
+            },
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("inventory", "0009_remove_productinventory_features_product_features"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="rating_1_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_2_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_3_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_4_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_5_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_avg",
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_sum",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_rating_summary, migrations.RunPython.noop),
+    ]
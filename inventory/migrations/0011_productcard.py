@@ -0,0 +1,167 @@
+# Generated by Django 4.1.6 on 2026-10-18 13:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+import storage.custom_cloudinary_storage
+from django.db.models import Exists, Max, Min, OuterRef, Q
+
+
+def populate_product_cards(apps, schema_editor):
+    Category = apps.get_model("inventory", "Category")
+    Media = apps.get_model("inventory", "Media")
+    Product = apps.get_model("inventory", "Product")
+    ProductCard = apps.get_model("inventory", "ProductCard")
+    ProductInventory = apps.get_model("inventory", "ProductInventory")
+    Stock = apps.get_model("inventory", "Stock")
+
+    categories = {category.pk: category for category in Category.objects.all()}
+    active_inventories = Q(inventories__is_active=True)
+    products = (
+        Product.objects.filter(is_active=True)
+        .select_related("brand")
+        .annotate(
+            card_min_price=Min("inventories__sale_price", filter=active_inventories),
+            card_max_price=Max("inventories__sale_price", filter=active_inventories),
+            card_in_stock=Exists(
+                Stock.objects.filter(
+                    product_inventory__product=OuterRef("pk"),
+                    product_inventory__is_active=True,
+                    units__gt=0,
+                )
+            ),
+        )
+    )
+
+    default_inventories = {}
+    for inventory in (
+        ProductInventory.objects.filter(is_active=True)
+        .order_by("-is_default", "pk")
+        .values("pk", "product_id", "sku")
+    ):
+        default_inventories.setdefault(inventory["product_id"], inventory)
+
+    feature_images = {}
+    for media in (
+        Media.objects.filter(
+            product_inventory__in=[inv["pk"] for inv in default_inventories.values()]
+        )
+        .order_by("-is_feature", "pk")
+        .values("product_inventory_id", "image")
+    ):
+        feature_images.setdefault(media["product_inventory_id"], media["image"])
+
+    product_categories = {}
+    for product_id, category_id in Product.category.through.objects.values_list(
+        "product_id", "category_id"
+    ):
+        current = product_categories.get(product_id)
+        category = categories[category_id]
+        if current is None or (category.level, category.name) > (
+            current.level,
+            current.name,
+        ):
+            product_categories[product_id] = category
+
+    cards = []
+    for product in products:
+        default_inventory = default_inventories.get(product.pk, {})
+        category = product_categories.get(product.pk)
+        path = []
+        while category is not None:
+            path.insert(0, category.name)
+            category = categories.get(category.parent_id)
+        cards.append(
+            ProductCard(
+                product=product,
+                name=product.name,
+                slug=product.slug,
+                brand_name=product.brand.name,
+                min_price=product.card_min_price,
+                max_price=product.card_max_price,
+                default_sku=default_inventory.get("sku"),
+                feature_image=feature_images.get(default_inventory.get("pk"), ""),
+                rating_avg=product.rating_avg,
+                rating_count=product.rating_count,
+                in_stock=product.card_in_stock,
+                category_path=" > ".join(path),
+                created_at=product.created_at,
+            )
+        )
+    ProductCard.objects.bulk_create(cards, batch_size=500)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("inventory", "0010_product_rating_summary"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductCard",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="card",
+                        serialize=False,
+                        to="inventory.product",
+                    ),
+                ),
+                ("name", models.CharField(max_length=255)),
+                ("slug", models.CharField(max_length=150)),
+                ("brand_name", models.CharField(max_length=255)),
+                (
+                    "min_price",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=7, null=True
+                    ),
+                ),
+                (
+                    "max_price",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=7, null=True
+                    ),
+                ),
+                ("default_sku", models.CharField(blank=True, max_length=20, null=True)),
+                (
+                    "feature_image",
+                    models.ImageField(
+                        blank=True,
+                        storage=storage.custom_cloudinary_storage.CustomStorage(),
+                        upload_to="",
+                    ),
+                ),
+                ("rating_avg", models.FloatField(default=0)),
+                ("rating_count", models.IntegerField(default=0)),
+                ("in_stock", models.BooleanField(default=False)),
+                ("category_path", models.CharField(blank=True, max_length=255)),
+                ("created_at", models.DateTimeField()),
+                ("refreshed_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Product Card",
+                "verbose_name_plural": "Product Cards",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="productcard",
+            index=models.Index(
+                fields=["created_at", "product"], name="inventory_p_created_77aee6_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productcard",
+            index=models.Index(
+                fields=["min_price", "product"], name="inventory_p_min_pri_563ee8_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productcard",
+            index=models.Index(
+                fields=["name", "product"], name="inventory_p_name_27fa73_idx"
+            ),
+        ),
+        migrations.RunPython(populate_product_cards, migrations.RunPython.noop),
+    ]
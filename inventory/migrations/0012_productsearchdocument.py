@@ -0,0 +1,85 @@
+# Generated by Django 4.1.6 on 2026-10-18 13:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+from collections import defaultdict
+
+
+def populate_search_documents(apps, schema_editor):
+    Product = apps.get_model("inventory", "Product")
+    ProductInventory = apps.get_model("inventory", "ProductInventory")
+    ProductSearchDocument = apps.get_model("inventory", "ProductSearchDocument")
+
+    features = defaultdict(list)
+    for product_id, name, value in Product.features.through.objects.values_list(
+        "product_id", "productfeature__feature_name", "productfeature__feature_value"
+    ):
+        features[product_id].extend(filter(None, (name, value)))
+
+    attributes = defaultdict(list)
+    for product_id, name, value in (
+        ProductInventory.attribute_values.through.objects.filter(
+            productinventory__is_active=True
+        )
+        .values_list(
+            "productinventory__product_id",
+            "productattributevalue__product_attribute__name",
+            "productattributevalue__attribute_value",
+        )
+        .distinct()
+    ):
+        attributes[product_id].extend((name, value))
+
+    ProductSearchDocument.objects.bulk_create(
+        [
+            ProductSearchDocument(
+                product=product,
+                name=product.name,
+                brand=product.brand.name,
+                product_type=product.product_type.name,
+                features=" ".join(features[product.pk]),
+                attributes=" ".join(attributes[product.pk]),
+                description=product.description,
+                is_active=product.is_active,
+            )
+            for product in Product.objects.select_related("brand", "product_type")
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("inventory", "0011_productcard"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductSearchDocument",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="search_document",
+                        serialize=False,
+                        to="inventory.product",
+                    ),
+                ),
+                ("name", models.CharField(max_length=255)),
+                ("brand", models.CharField(max_length=255)),
+                ("product_type", models.CharField(max_length=255)),
+                ("features", models.TextField(blank=True)),
+                ("attributes", models.TextField(blank=True)),
+                ("description", models.TextField(blank=True)),
+                ("is_active", models.BooleanField(default=True)),
+                ("updated_at", models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+            options={
+                "verbose_name": "Product Search Document",
+                "verbose_name_plural": "Product Search Documents",
+            },
+        ),
+        migrations.RunPython(populate_search_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.1.6 on 2026-10-18 13:16
+
+from django.db import migrations, models
+from django.db.models import Max, Min, OuterRef, Subquery
+
+
+def populate_price_range(apps, schema_editor):
+    Product = apps.get_model("inventory", "Product")
+    ProductInventory = apps.get_model("inventory", "ProductInventory")
+    prices = (
+        ProductInventory.objects.filter(product=OuterRef("pk"), is_active=True)
+        .order_by()
+        .values("product")
+    )
+    Product.objects.update(
+        min_price=Subquery(prices.annotate(price=Min("sale_price")).values("price")),
+        max_price=Subquery(prices.annotate(price=Max("sale_price")).values("price")),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("inventory", "0012_productsearchdocument"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="max_price",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, editable=False, max_digits=7, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="min_price",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, editable=False, max_digits=7, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["min_price", "id"], name="inventory_p_min_pri_fa54ea_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["max_price", "id"], name="inventory_p_max_pri_ba3f07_idx"
+            ),
+        ),
+        migrations.RunPython(populate_price_range, migrations.RunPython.noop),
+    ]
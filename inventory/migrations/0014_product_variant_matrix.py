@@ -0,0 +1,53 @@
+# Generated by Django 4.1.6 on 2026-10-18 13:18
+
+from collections import defaultdict
+from django.db import migrations, models
+from inventory.models import build_variant_matrix
+
+
+def populate_variant_matrix(apps, schema_editor):
+    Product = apps.get_model("inventory", "Product")
+    ProductInventory = apps.get_model("inventory", "ProductInventory")
+    attribute_values = defaultdict(dict)
+    for (
+        inventory_id,
+        attribute,
+        value,
+    ) in ProductInventory.attribute_values.through.objects.filter(
+        productinventory__is_active=True
+    ).values_list(
+        "productinventory_id",
+        "productattributevalue__product_attribute__name",
+        "productattributevalue__attribute_value",
+    ):
+        attribute_values[inventory_id][attribute] = value
+
+    variants = defaultdict(list)
+    for inventory in (
+        ProductInventory.objects.filter(is_active=True)
+        .order_by("pk")
+        .values("pk", "product_id", "sku", "sale_price", "stock__units")
+    ):
+        variants[inventory["product_id"]].append(inventory)
+
+    products = list(Product.objects.only("pk"))
+    for product in products:
+        product.variant_matrix = build_variant_matrix(
+            variants[product.pk], attribute_values
+        )
+    Product.objects.bulk_update(products, ["variant_matrix"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("inventory", "0013_product_price_range"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="variant_matrix",
+            field=models.JSONField(default=dict, editable=False),
+        ),
+        migrations.RunPython(populate_variant_matrix, migrations.RunPython.noop),
+    ]
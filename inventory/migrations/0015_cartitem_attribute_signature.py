@@ -0,0 +1,63 @@
+# Generated by Django 4.1.6 on 2026-10-18 13:20
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def sign_and_merge_cart_items(apps, schema_editor):
+    # signatures for the existing lines, then lines left with the same
+    # cart/inventory/signature/price are merged into the oldest one
+    CartItem = apps.get_model("inventory", "CartItem")
+    attribute_values = defaultdict(set)
+    for item_id, value_id in CartItem.attribute_values.through.objects.values_list(
+        "cartitem_id", "productattributevalue_id"
+    ):
+        attribute_values[item_id].add(value_id)
+
+    lines = {}
+    for item in CartItem.objects.order_by("pk"):
+        item.attribute_signature = ",".join(
+            str(pk) for pk in sorted(attribute_values[item.pk])
+        )
+        key = (
+            item.cart_id,
+            item.product_inventory_id,
+            item.attribute_signature,
+            item.unit_price,
+        )
+        if key in lines:
+            lines[key].quantity += item.quantity
+            item.delete()
+        else:
+            lines[key] = item
+    CartItem.objects.bulk_update(
+        lines.values(), ["attribute_signature", "quantity"], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("inventory", "0014_product_variant_matrix"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cartitem",
+            name="attribute_signature",
+            field=models.CharField(blank=True, default="", max_length=255),
+        ),
+        migrations.RunPython(sign_and_merge_cart_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="cartitem",
+            constraint=models.UniqueConstraint(
+                fields=(
+                    "cart",
+                    "product_inventory",
+                    "attribute_signature",
+                    "unit_price",
+                ),
+                name="unique_cart_line",
+            ),
+        ),
+    ]
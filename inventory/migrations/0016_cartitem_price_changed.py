@@ -0,0 +1,17 @@
+# Generated by Django 4.1.6 on 2026-10-18 13:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("inventory", "0015_cartitem_attribute_signature"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cartitem",
+            name="price_changed",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
@@ -1,5 +1,14 @@
-from uuid import uuid4
-from django.db import models
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from uuid import UUID, uuid4
+from django.db import models, transaction
+from django.db.models import (
+    Case, Count, Exists, F, FloatField, Max, Min, OuterRef, Prefetch, Q, Subquery, Sum, Value,
+    When
+)
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
 from django_extensions.db.fields import (
     AutoSlugField,
     CreationDateTimeField,
@@ -11,11 +20,29 @@ from mptt.models import (
     TreeManyToManyField,
 )
 
+from inventory.catalog_cache import bump_version
 from storage.custom_cloudinary_storage import CustomStorage
 from utils.generate_sku import generate_sku
 from django.core.exceptions import ValidationError
 from django.contrib.auth import get_user_model
 
+# ! star values a review can carry, each one has a rating_<star>_count column on Product
+RATING_STARS = (1, 2, 3, 4, 5)
+
+RATING_SUMMARY_FIELDS = [
+    'rating_count',
+    'rating_sum',
+    'rating_avg',
+    *[f'rating_{star}_count' for star in RATING_STARS],
+]
+
+
+# ! facets ProductQuerySet.facet_counts() can compute
+PRODUCT_FACETS = ('brand', 'category', 'price', 'rating')
+# ? lower bounds of the price facet buckets, the last one is open ended
+PRICE_FACET_EDGES = (0, 25, 50, 100, 250, 500)
+
+
 # !  CATEGORY MODEL
 
 
@@ -86,6 +113,228 @@ class Brand(models.Model):
         return self.name
 
 
+# ! Product columns computed from other tables, never written by Product.save()
+PRODUCT_DERIVED_FIELDS = [*RATING_SUMMARY_FIELDS, 'min_price', 'max_price', 'variant_matrix']
+
+# ! nested relations a product payload can carry, see ProductQuerySet.with_listing_plan()
+PRODUCT_RELATIONS = ('category', 'features', 'inventory')
+
+
+def build_variant_matrix(inventories, attribute_values):
+    # ! {"attributes": [[name, [value, ...]], ...],
+    # !  "variants": {"<value index>:<value index>": [sku, price, units]}}
+    # ? attributes and their values are sorted by name, a key holds one value
+    # ? index per attribute in that order, "-" where a variant lacks it
+    values = defaultdict(set)
+    for inventory in inventories:
+        for attribute, value in attribute_values.get(inventory['pk'], {}).items():
+            values[attribute].add(value)
+    attributes = [[attribute, sorted(values[attribute])] for attribute in sorted(values)]
+    positions = [
+        {value: index for index, value in enumerate(names)} for _, names in attributes
+    ]
+    matrix = {}
+    for inventory in inventories:
+        combination = attribute_values.get(inventory['pk'], {})
+        key = ':'.join(
+            str(position[combination[attribute]]) if attribute in combination else '-'
+            for (attribute, _), position in zip(attributes, positions)
+        )
+        price = inventory['sale_price']
+        # ? the first variant of a combination wins, later duplicates are ignored
+        matrix.setdefault(key, [
+            inventory['sku'],
+            None if price is None else str(price),
+            inventory['stock__units'] or 0,
+        ])
+    return {'attributes': attributes, 'variants': matrix}
+
+
+class ProductQuerySet(models.QuerySet):
+    def with_listing_plan(self, relations=PRODUCT_RELATIONS):
+        # ! everything the product serializers read is joined, prefetched or
+        # ! annotated here so a page of products costs the same number of
+        # ! queries no matter how many products it holds.
+        # ? only the nested `relations` that will be serialized are prefetched
+        queryset = self.select_related(
+            'brand',
+            'card',
+        )
+        if 'category' in relations:
+            queryset = queryset.prefetch_related('category')
+        if 'features' in relations:
+            queryset = queryset.prefetch_related('features')
+        if 'inventory' in relations:
+            queryset = queryset.prefetch_related(
+                Prefetch(
+                    'inventories',
+                    queryset=ProductInventory.objects.select_related(
+                        'stock',
+                    ).prefetch_related(
+                        'images',
+                        Prefetch(
+                            'attribute_values',
+                            queryset=ProductAttributeValue.objects.select_related(
+                                'product_attribute')
+                        )
+                    )
+                )
+            )
+        return queryset
+
+    def facet_counts(self, facets=PRODUCT_FACETS, price_edges=PRICE_FACET_EDGES):
+        # ! per brand, category, price bucket and star counts over the products
+        # ! of this queryset: one pass over the product rows, plus one grouped
+        # ! query over the category links when categories are asked for
+        # ? the filtered query only feeds the ids, so joins of the filters
+        # ? never count a product twice
+        products = self.model.objects.filter(pk__in=self.values('pk')).order_by()
+        result = {}
+        if {'brand', 'price', 'rating'} & set(facets):
+            brands, brand_names = Counter(), {}
+            prices = [0] * len(price_edges)
+            stars = Counter()
+            star_fields = [f'rating_{star}_count' for star in RATING_STARS]
+            rows = products.values_list('brand_id', 'brand__name', 'min_price', *star_fields)
+            for brand_id, brand_name, price, *star_counts in rows:
+                brands[brand_id] += 1
+                brand_names[brand_id] = brand_name
+                if price is not None and price >= price_edges[0]:
+                    prices[bisect_right(price_edges, price) - 1] += 1
+                for star, count in zip(RATING_STARS, star_counts):
+                    if count:
+                        stars[star] += 1
+            if 'brand' in facets:
+                result['brand'] = [
+                    {'id': brand_id, 'name': brand_names[brand_id], 'count': count}
+                    for brand_id, count in sorted(
+                        brands.items(), key=lambda item: (-item[1], brand_names[item[0]]))
+                ]
+            if 'price' in facets:
+                bounds = [*price_edges[1:], None]
+                result['price'] = [
+                    {'min': low, 'max': high, 'count': count}
+                    for low, high, count in zip(price_edges, bounds, prices)
+                ]
+            if 'rating' in facets:
+                result['rating'] = [
+                    {'rating': star, 'count': stars[star]} for star in RATING_STARS
+                ]
+        if 'category' in facets:
+            result['category'] = [
+                {
+                    'id': row['category_id'],
+                    'name': row['category__name'],
+                    'slug': row['category__slug'],
+                    'count': row['count'],
+                }
+                for row in self.model.category.through.objects.filter(
+                    product__in=products.values('pk'),
+                ).values(
+                    'category_id', 'category__name', 'category__slug',
+                ).annotate(
+                    count=Count('product_id', distinct=True),
+                ).order_by('-count', 'category__name')
+            ]
+        return result
+
+    def refresh_prices(self):
+        # ! rewrites the stored min/max sale price of the active variants with
+        # ! a single UPDATE, see ProductInventory for the writes calling it
+        prices = ProductInventory.objects.filter(
+            product=OuterRef('pk'), is_active=True,
+        ).order_by().values('product')
+        return self.update(
+            min_price=Subquery(prices.annotate(price=Min('sale_price')).values('price')),
+            max_price=Subquery(prices.annotate(price=Max('sale_price')).values('price')),
+        )
+
+    def refresh_variant_matrix(self, batch_size=500):
+        # ! rebuilds the stored variant matrix of these products from their
+        # ! active inventories, attribute values, prices and stock, a few
+        # ! set-based queries per batch. Only changed rows are written, with
+        # ! their updated_at, so detail page validators follow the matrix
+        product_ids = list(self.order_by('pk').values_list('pk', flat=True))
+        for start in range(0, len(product_ids), batch_size):
+            batch_ids = product_ids[start:start + batch_size]
+            attribute_values = defaultdict(dict)
+            for inventory_id, attribute, value in ProductInventory.attribute_values.through.objects.filter(
+                productinventory__product__in=batch_ids,
+                productinventory__is_active=True,
+            ).values_list(
+                'productinventory_id',
+                'productattributevalue__product_attribute__name',
+                'productattributevalue__attribute_value',
+            ):
+                attribute_values[inventory_id][attribute] = value
+
+            variants = defaultdict(list)
+            for inventory in ProductInventory.objects.filter(
+                product__in=batch_ids, is_active=True,
+            ).order_by('pk').values('pk', 'product_id', 'sku', 'sale_price', 'stock__units'):
+                variants[inventory['product_id']].append(inventory)
+
+            products = []
+            for product in self.model.objects.filter(pk__in=batch_ids).only('pk', 'variant_matrix'):
+                matrix = build_variant_matrix(variants[product.pk], attribute_values)
+                if matrix != product.variant_matrix:
+                    product.variant_matrix = matrix
+                    product.updated_at = timezone.now()
+                    products.append(product)
+            self.model.objects.bulk_update(products, ['variant_matrix', 'updated_at'])
+        return len(product_ids)
+
+    def apply_rating(self, rating, sign=1):
+        # ! adds (sign=1) or removes (sign=-1) one review of `rating` stars from
+        # ! the stored summary, call it inside the transaction writing the review
+        star_field = f'rating_{rating}_count'
+        changes = {
+            'rating_count': F('rating_count') + sign,
+            'rating_sum': F('rating_sum') + sign * rating,
+        }
+        if rating in RATING_STARS:
+            changes[star_field] = F(star_field) + sign
+        self.update(**changes)
+        # ? the average follows from the count and sum written above
+        return self.update(
+            rating_avg=Case(
+                When(rating_count=0, then=Value(0.0)),
+                default=Cast('rating_sum', FloatField()) / F('rating_count'),
+            )
+        )
+
+    def rebuild_rating_summary(self, batch_size=500):
+        # ! recomputes the summary from the reviews table, one grouped aggregate
+        # ! and one bulk update per batch of products
+        product_ids = list(self.order_by('pk').values_list('pk', flat=True))
+        for start in range(0, len(product_ids), batch_size):
+            batch_ids = product_ids[start:start + batch_size]
+            summaries = {
+                summary.pop('product'): summary
+                for summary in Review.objects.filter(
+                    product__in=batch_ids
+                ).order_by().values('product').annotate(
+                    rating_count=Count('pk'),
+                    rating_sum=Sum('rating'),
+                    **{
+                        f'rating_{star}_count': Count('pk', filter=Q(rating=star))
+                        for star in RATING_STARS
+                    }
+                )
+            }
+            products = []
+            for product_id in batch_ids:
+                summary = summaries.get(product_id, {})
+                product = self.model(pk=product_id)
+                for field in RATING_SUMMARY_FIELDS:
+                    setattr(product, field, summary.get(field, 0))
+                if product.rating_count:
+                    product.rating_avg = product.rating_sum / product.rating_count
+                products.append(product)
+            self.model.objects.bulk_update(products, RATING_SUMMARY_FIELDS)
+        return len(product_ids)
+
+
 # !  PRODUCT MODEL
 class Product(models.Model):
     uuid = models.CharField(
@@ -137,14 +386,51 @@ class Product(models.Model):
         related_name='inventory_features',
 
     )
+    # ! rating summary, maintained by Review.save()/Review.delete()
+    # ! and rebuilt by the rebuild_rating_summaries command
+    rating_count = models.IntegerField(default=0, editable=False)
+    rating_sum = models.IntegerField(default=0, editable=False)
+    rating_avg = models.FloatField(default=0, editable=False)
+    rating_1_count = models.IntegerField(default=0, editable=False)
+    rating_2_count = models.IntegerField(default=0, editable=False)
+    rating_3_count = models.IntegerField(default=0, editable=False)
+    rating_4_count = models.IntegerField(default=0, editable=False)
+    rating_5_count = models.IntegerField(default=0, editable=False)
+    # ! sale price range of the active variants, maintained by the
+    # ! ProductInventory writes through ProductQuerySet.refresh_prices()
+    min_price = models.DecimalField(
+        max_digits=7, decimal_places=2, null=True, blank=True, editable=False)
+    max_price = models.DecimalField(
+        max_digits=7, decimal_places=2, null=True, blank=True, editable=False)
+
+    # ! attribute combination -> sku, price and stock of the active variants,
+    # ! see build_variant_matrix(). Refreshed by the receivers in signals.handler
+    variant_matrix = models.JSONField(default=dict, editable=False)
+
+    objects = ProductQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Product'
         verbose_name_plural = 'Products'
+        # ? ?price= range filter and sort=price keyset pages
+        indexes = [
+            models.Index(fields=['min_price', 'id']),
+            models.Index(fields=['max_price', 'id']),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # ! the derived columns are only written by set-based updates, saving
+        # ! an instance loaded before one of them ran must not put old values back
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in PRODUCT_DERIVED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 
 class ProductAttribute(models.Model):
     name = models.CharField(
@@ -206,6 +492,154 @@ class ProductFeature(models.Model):
         return f"{self.feature_name} - {self.feature_value}"
 
 
+# ! ProductInventory columns the stored Product prices depend on
+PRICE_SOURCE_FIELDS = {'sale_price', 'is_active', 'product', 'product_id'}
+
+
+def reprice_carts_on_commit(inventory_ids):
+    # ? cart lines follow a sale price change once it is committed
+    inventory_ids = list(inventory_ids)
+    transaction.on_commit(lambda: CartItem.objects.reprice(inventory_ids))
+
+
+# ! DEFERRED CATALOG REFRESHES
+# ? writes only collect what went stale: the products whose card, variant
+# ? matrix or search document has to be rebuilt and the models whose version
+# ? counter has to move. A single on-commit callback per transaction rebuilds
+# ? each of them once for all the products, then bumps the versions, so no
+# ? response gets cached under a new version with stale derived data
+PRODUCT_REFRESHES = ('card', 'variant_matrix', 'search_document')
+
+
+class CatalogRefresh:
+    def __init__(self):
+        self.product_ids = {refresh: set() for refresh in PRODUCT_REFRESHES}
+        # ? dict keys keep the order the models were queued in
+        self.versions = {}
+        # ? set once it ran or handed its work on to a later refresh
+        self.done = False
+
+    def add(self, product_ids, refreshes, versions):
+        for refresh in refreshes:
+            self.product_ids[refresh].update(product_ids)
+        self.versions.update(dict.fromkeys(versions))
+
+    def take_over(self, other):
+        for refresh, product_ids in other.product_ids.items():
+            self.product_ids[refresh].update(product_ids)
+        self.versions.update(other.versions)
+        other.done = True
+
+    def __call__(self):
+        if self.done:
+            return
+        self.done = True
+        product_ids = self.product_ids
+        if product_ids['card']:
+            ProductCard.objects.refresh(product_ids['card'])
+        if product_ids['variant_matrix']:
+            Product.objects.filter(pk__in=product_ids['variant_matrix']).refresh_variant_matrix()
+        if product_ids['card'] or product_ids['variant_matrix']:
+            self.versions[Product] = None
+        if product_ids['search_document'] and ProductSearchDocument.objects.refresh(
+                product_ids['search_document']):
+            # ? tells every process to pull the rewritten documents
+            self.versions[ProductSearchDocument] = None
+        for model in self.versions:
+            bump_version(model)
+
+
+def queue_catalog_refresh(product_ids=(), refreshes=PRODUCT_REFRESHES, versions=()):
+    # ! adds to the refresh of the running transaction, which runs once on
+    # ! commit, after everything queued before it. Outside a transaction it
+    # ! runs right away
+    connection = transaction.get_connection()
+    refresh = CatalogRefresh()
+    refresh.add(product_ids, refreshes, versions)
+    pending = getattr(connection, 'catalog_refresh', None)
+    # ? the pending refresh hands its work on when it is still queued and no
+    # ? savepoint it was not queued in is open, so a rollback drops both or
+    # ? neither. One that ran or was dropped with a rolled back savepoint is
+    # ? left alone. atomic(savepoint=False) blocks open a None savepoint that
+    # ? never rolls back on its own
+    savepoint_ids = set(connection.savepoint_ids) - {None}
+    if pending is not None and not pending.done and connection.in_atomic_block and any(
+        func is pending and savepoint_ids <= sids
+        for sids, func in connection.run_on_commit
+    ):
+        refresh.take_over(pending)
+    connection.catalog_refresh = refresh
+    transaction.on_commit(refresh)
+
+
+def refresh_products_on_commit(product_ids):
+    # ! what the signal receivers do after a single variant save: once the
+    # ! bulk write commits, the cards and variant matrices of the products are
+    # ! rebuilt and the catalog versions bumped so cached responses move on
+    queue_catalog_refresh(
+        product_ids, ('card', 'variant_matrix'), versions=[ProductInventory, Product])
+
+
+class ProductInventoryQuerySet(models.QuerySet):
+    # ! bulk writes bypass save()/delete() and their signals, so they refresh
+    # ! the stored prices of the products they touched themselves, in the
+    # ! same transaction, then everything derived from them on commit, and
+    # ! reprice the cart lines of changed sale prices
+    def update(self, **kwargs):
+        if not PRICE_SOURCE_FIELDS & kwargs.keys():
+            return super().update(**kwargs)
+        # ? as save() would, so the detail validators see the change
+        kwargs.setdefault('updated_at', timezone.now())
+        with transaction.atomic(using=self.db):
+            product_ids = set(self.values_list('product_id', flat=True))
+            if 'sale_price' in kwargs:
+                reprice_carts_on_commit(self.values_list('pk', flat=True))
+            rows = super().update(**kwargs)
+            # ? variants moved to another product change its prices as well
+            new_product = kwargs.get('product', kwargs.get('product_id'))
+            if new_product is not None:
+                product_ids.add(getattr(new_product, 'pk', new_product))
+            Product.objects.filter(pk__in=product_ids).refresh_prices()
+            refresh_products_on_commit(product_ids)
+        return rows
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        if not PRICE_SOURCE_FIELDS & set(fields):
+            return super().bulk_update(objs, fields, *args, **kwargs)
+        if 'updated_at' not in fields:
+            now = timezone.now()
+            for obj in objs:
+                obj.updated_at = now
+            fields = [*fields, 'updated_at']
+        with transaction.atomic(using=self.db):
+            product_ids = {obj.product_id for obj in objs}
+            if {'product', 'product_id'} & set(fields):
+                product_ids.update(self.model.objects.filter(
+                    pk__in=[obj.pk for obj in objs]).values_list('product_id', flat=True))
+            if 'sale_price' in fields:
+                reprice_carts_on_commit(obj.pk for obj in objs)
+            rows = super().bulk_update(objs, fields, *args, **kwargs)
+            Product.objects.filter(pk__in=product_ids).refresh_prices()
+            refresh_products_on_commit(product_ids)
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            product_ids = {obj.product_id for obj in objs}
+            Product.objects.filter(pk__in=product_ids).refresh_prices()
+            refresh_products_on_commit(product_ids)
+        return objs
+
+    def delete(self):
+        with transaction.atomic(using=self.db):
+            product_ids = set(self.values_list('product_id', flat=True))
+            deleted = super().delete()
+            Product.objects.filter(pk__in=product_ids).refresh_prices()
+        return deleted
+
+
 # !  PRODUCT INVENTORY MODEL
 class ProductInventory(models.Model):
     # ! one product has many  ProductInventory ->  []
@@ -287,6 +721,8 @@ class ProductInventory(models.Model):
         verbose_name='Product Inventory Updated At'
     )
 
+    objects = ProductInventoryQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Product Inventory'
         verbose_name_plural = 'Product Inventories'
@@ -297,10 +733,47 @@ class ProductInventory(models.Model):
 
     def save(self, *args, **kwargs):
         is_new_instance = self.pk is None
-        super().save(*args, **kwargs)
-        if is_new_instance:  # only generate sku for new instances
-            self.sku = generate_sku(pk=self.pk)
-        super().save(*args, **kwargs)
+        # ? without a savepoint, as Model.save_base, so the receivers queue
+        # ? their refreshes in the savepoint of the caller
+        with transaction.atomic(savepoint=False):
+            # ! the stored row before this save, None for a new variant: cart
+            # ! lines are only repriced when the sale price really moved, and
+            # ! the receivers in signals.handler skip what did not change
+            self.previous_state = None
+            if not is_new_instance:
+                self.previous_state = ProductInventory.objects.select_for_update().filter(
+                    pk=self.pk).values('product_id', 'is_active', 'sale_price').first()
+            super().save(*args, **kwargs)
+            if is_new_instance:  # only generate sku for new instances
+                self.sku = generate_sku(pk=self.pk)
+                # ? written without a second save(), which would run every
+                # ? receiver of the variant again
+                ProductInventory.objects.filter(pk=self.pk).update(sku=self.sku)
+            # ? a variant moved to another product changes the prices of both
+            product_ids = {self.product_id}
+            if self.previous_state:
+                product_ids.add(self.previous_state['product_id'])
+            Product.objects.filter(pk__in=product_ids).refresh_prices()
+            if self.previous_state and self.previous_state['sale_price'] != self.sale_price:
+                reprice_carts_on_commit([self.pk])
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            deleted = super().delete(*args, **kwargs)
+            Product.objects.filter(pk=self.product_id).refresh_prices()
+        return deleted
+
+    @property
+    def available_units(self):
+        # ! units that can still be sold: nothing for inactive variants or
+        # ! variants without stock. select_related('stock') before reading it
+        # ? there are no reservations yet, so this is the stock level itself
+        if not self.is_active:
+            return 0
+        try:
+            return max(self.stock.units, 0)
+        except Stock.DoesNotExist:
+            return 0
 
 
 # ! MEDIA MODEL
@@ -372,11 +845,267 @@ class Stock(models.Model):
         return self.product_inventory.product.name
 
 
+class ProductCardQuerySet(models.QuerySet):
+    def refresh(self, product_ids=None, batch_size=500):
+        # ! recomputes the cards of `product_ids` (every product when None) with a
+        # ! handful of set-based queries per batch, inactive or deleted products
+        # ! lose their card
+        if product_ids is None:
+            product_ids = Product.objects.values_list('pk', flat=True)
+        product_ids = sorted(set(product_ids))
+        categories = {
+            category.pk: category for category in Category.objects.all()
+        }
+        for start in range(0, len(product_ids), batch_size):
+            self._refresh_batch(
+                product_ids[start:start + batch_size], categories)
+
+    def _refresh_batch(self, product_ids, categories):
+        active_inventories = Q(inventories__is_active=True)
+        products = Product.objects.filter(
+            pk__in=product_ids, is_active=True
+        ).select_related('brand').annotate(
+            card_min_price=Min('inventories__sale_price',
+                               filter=active_inventories),
+            card_max_price=Max('inventories__sale_price',
+                               filter=active_inventories),
+            card_in_stock=Exists(Stock.objects.filter(
+                product_inventory__product=OuterRef('pk'),
+                product_inventory__is_active=True,
+                units__gt=0,
+            )),
+        )
+
+        # ? the default variant is the flagged one, else the oldest active one
+        default_inventories = {}
+        for inventory in ProductInventory.objects.filter(
+            product__in=product_ids, is_active=True
+        ).order_by('-is_default', 'pk').values('pk', 'product_id', 'sku'):
+            default_inventories.setdefault(inventory['product_id'], inventory)
+
+        feature_images = {}
+        for media in Media.objects.filter(
+            product_inventory__in=[inv['pk'] for inv in default_inventories.values()]
+        ).order_by('-is_feature', 'pk').values('product_inventory_id', 'image'):
+            feature_images.setdefault(
+                media['product_inventory_id'], media['image'])
+
+        # ? the deepest category of a product gives its path
+        product_categories = {}
+        for product_id, category_id in Product.category.through.objects.filter(
+            product__in=product_ids
+        ).values_list('product_id', 'category_id'):
+            current = product_categories.get(product_id)
+            category = categories[category_id]
+            if current is None or (category.level, category.name) > (current.level, current.name):
+                product_categories[product_id] = category
+
+        cards = []
+        for product in products:
+            default_inventory = default_inventories.get(product.pk, {})
+            category = product_categories.get(product.pk)
+            path = []
+            while category is not None:
+                path.insert(0, category.name)
+                category = categories.get(category.parent_id)
+            cards.append(ProductCard(
+                product=product,
+                name=product.name,
+                slug=product.slug,
+                brand_name=product.brand.name,
+                min_price=product.card_min_price,
+                max_price=product.card_max_price,
+                default_sku=default_inventory.get('sku'),
+                feature_image=feature_images.get(
+                    default_inventory.get('pk'), ''),
+                rating_avg=product.rating_avg,
+                rating_count=product.rating_count,
+                in_stock=product.card_in_stock,
+                category_path=' > '.join(path),
+                created_at=product.created_at,
+            ))
+
+        with transaction.atomic():
+            self.model.objects.filter(product__in=product_ids).exclude(
+                product__in=[card.product_id for card in cards]).delete()
+            self.model.objects.bulk_create(
+                cards,
+                update_conflicts=True,
+                unique_fields=['product'],
+                update_fields=[
+                    field.name for field in ProductCard._meta.concrete_fields
+                    if not field.primary_key
+                ],
+            )
+
+
+# ! denormalized listing row, one per active product, kept fresh by the
+# ! receivers in signals.handler and rebuilt by the rebuild_product_cards command
+class ProductCard(models.Model):
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='card'
+    )
+    name = models.CharField(max_length=255)
+    slug = models.CharField(max_length=150)
+    brand_name = models.CharField(max_length=255)
+    min_price = models.DecimalField(
+        max_digits=7, decimal_places=2, null=True, blank=True)
+    max_price = models.DecimalField(
+        max_digits=7, decimal_places=2, null=True, blank=True)
+    default_sku = models.CharField(max_length=20, null=True, blank=True)
+    feature_image = models.ImageField(
+        storage=CustomStorage(),
+        blank=True
+    )
+    rating_avg = models.FloatField(default=0)
+    rating_count = models.IntegerField(default=0)
+    in_stock = models.BooleanField(default=False)
+    category_path = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField()
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    objects = ProductCardQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Product Card'
+        verbose_name_plural = 'Product Cards'
+        indexes = [
+            models.Index(fields=['created_at', 'product']),
+            models.Index(fields=['min_price', 'product']),
+            models.Index(fields=['name', 'product']),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class ProductSearchDocumentQuerySet(models.QuerySet):
+    def refresh(self, product_ids=None, batch_size=500):
+        # ! rewrites the search documents of `product_ids` (every product when
+        # ! None) from a few set-based queries per batch. Only documents whose
+        # ! text changed are written, their number is returned
+        if product_ids is None:
+            product_ids = Product.objects.values_list('pk', flat=True)
+        product_ids = sorted(set(product_ids))
+        changed = 0
+        for start in range(0, len(product_ids), batch_size):
+            changed += self._refresh_batch(product_ids[start:start + batch_size])
+        return changed
+
+    def _refresh_batch(self, product_ids):
+        features = defaultdict(list)
+        for product_id, name, value in Product.features.through.objects.filter(
+            product__in=product_ids
+        ).values_list('product_id', 'productfeature__feature_name', 'productfeature__feature_value'):
+            features[product_id].extend(filter(None, (name, value)))
+
+        attributes = defaultdict(list)
+        for product_id, name, value in ProductInventory.attribute_values.through.objects.filter(
+            productinventory__product__in=product_ids,
+            productinventory__is_active=True,
+        ).values_list(
+            'productinventory__product_id',
+            'productattributevalue__product_attribute__name',
+            'productattributevalue__attribute_value',
+        ).distinct():
+            attributes[product_id].extend((name, value))
+
+        documents = [
+            ProductSearchDocument(
+                product=product,
+                name=product.name,
+                brand=product.brand.name,
+                product_type=product.product_type.name,
+                features=' '.join(features[product.pk]),
+                attributes=' '.join(attributes[product.pk]),
+                description=product.description,
+                is_active=product.is_active,
+            )
+            for product in Product.objects.filter(
+                pk__in=product_ids).select_related('brand', 'product_type')
+        ]
+        current = {
+            document.product_id: (document.fields, document.is_active)
+            for document in self.model.objects.filter(product__in=product_ids)
+        }
+        documents = [
+            document for document in documents
+            if current.get(document.product_id) != (document.fields, document.is_active)
+        ]
+        if not documents:
+            return 0
+        self.model.objects.bulk_create(
+            documents,
+            update_conflicts=True,
+            unique_fields=['product'],
+            update_fields=[
+                field.name for field in ProductSearchDocument._meta.concrete_fields
+                if not field.primary_key
+            ],
+        )
+        return len(documents)
+
+
+# ! the searchable text of a product, flattened from its brand, type, features
+# ! and attribute values. Kept fresh by the receivers in signals.handler and
+# ! loaded into the in-process index of inventory.search
+class ProductSearchDocument(models.Model):
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_document'
+    )
+    name = models.CharField(max_length=255)
+    brand = models.CharField(max_length=255)
+    product_type = models.CharField(max_length=255)
+    features = models.TextField(blank=True)
+    attributes = models.TextField(blank=True)
+    description = models.TextField(blank=True)
+    is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = ProductSearchDocumentQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Product Search Document'
+        verbose_name_plural = 'Product Search Documents'
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def fields(self):
+        return {
+            'name': self.name,
+            'brand': self.brand,
+            'product_type': self.product_type,
+            'features': self.features,
+            'attributes': self.attributes,
+            'description': self.description,
+        }
+
+
 # def validate_rating(value):
 #     if value < 1 or value > 5:
 #         raise ValidationError('Rating should be between 1 and 5')
 
 
+class ReviewQuerySet(models.QuerySet):
+    # ! bulk deletes (the admin's "delete selected" among them) bypass
+    # ! Review.delete(), the summary of the products they touched is
+    # ! recomputed in the same transaction
+    def delete(self):
+        with transaction.atomic(using=self.db):
+            product_ids = set(self.values_list('product_id', flat=True))
+            deleted = super().delete()
+            Product.objects.filter(pk__in=product_ids).rebuild_rating_summary()
+        return deleted
+
+
 class Review(models.Model):
     user = models.ForeignKey(
         get_user_model(), on_delete=models.DO_NOTHING, related_name='reviews')
@@ -387,6 +1116,8 @@ class Review(models.Model):
     created_at = models.DateField(auto_now_add=True)
     updated_at = models.DateField(auto_now=True)
 
+    objects = ReviewQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.user.first_name}"
 
@@ -400,6 +1131,28 @@ class Review(models.Model):
 
         super().clean()
 
+    # ! the product rating summary is written in the same transaction as the review,
+    # ! ahead of the review itself so post_save/post_delete receivers already see it
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            previous = None
+            if self.pk is not None:
+                previous = Review.objects.select_for_update().filter(
+                    pk=self.pk).values('product_id', 'rating').first()
+
+            if previous != {'product_id': self.product_id, 'rating': self.rating}:
+                if previous:
+                    Product.objects.filter(pk=previous['product_id']).apply_rating(
+                        previous['rating'], sign=-1)
+                Product.objects.filter(pk=self.product_id).apply_rating(self.rating)
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            Product.objects.filter(pk=self.product_id).apply_rating(
+                self.rating, sign=-1)
+            return super().delete(*args, **kwargs)
+
     class Meta:
         verbose_name = 'Product Review'
         verbose_name_plural = 'Product Reviews'
@@ -430,15 +1183,129 @@ class WishlistItem(models.Model):
         return f"{self.wishlist.user.email}-{self.product.name}"
 
 
+class CartQuerySet(models.QuerySet):
+    def with_summary(self):
+        # ! header figures of a cart computed in the same query as the cart
+        return self.annotate(
+            items_count=Count('cart_items'),
+            price_changes_count=Count('cart_items', filter=Q(cart_items__price_changed=True)),
+            cart_total_price=Coalesce(
+                Sum(F('cart_items__quantity') * F('cart_items__unit_price'),
+                    output_field=models.DecimalField(max_digits=12, decimal_places=2)),
+                Value(0),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            ),
+        )
+
+    def for_user(self, user):
+        # ! the user's cart, created under Cart.id_for_user() when missing
+        cart = self.filter(user=user).first()
+        if cart is None:
+            # ? get_or_create settles two first writes racing on the unique user
+            cart, _ = self.get_or_create(
+                user=user, defaults={'id': Cart.id_for_user(user.pk)})
+        return cart
+
+    def for_writing(self, user, cart_id):
+        # ! the user's cart when `cart_id` is theirs, created on the first write
+        # ! under the id Cart.id_for_user() handed out while it did not exist
+        cart = self.filter(user=user).first()
+        if cart is None and str(cart_id) == str(Cart.id_for_user(user.pk)):
+            cart = self.for_user(user)
+        return cart if cart is not None and str(cart.pk) == str(cart_id) else None
+
+
 class Cart(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid4)
     user = models.OneToOneField(
         get_user_model(), related_name='cart', on_delete=models.CASCADE, unique=True)
     created_at = models.DateField(auto_now_add=True)
 
+    objects = CartQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.id} - {self.user.email}"
 
+    @staticmethod
+    def id_for_user(user_id):
+        # ! carts are created lazily, reading one that does not exist yet
+        # ! answers with this id, which the first add then creates it under.
+        # ? keyed with SECRET_KEY: user pks are sequential, the id of someone
+        # ? else's cart must not be computable from theirs
+        digest = salted_hmac('inventory.Cart.id_for_user', str(user_id)).digest()
+        return UUID(bytes=digest[:16], version=4)
+
+
+class CartItemQuerySet(models.QuerySet):
+    def with_details(self):
+        # ! everything CartItemSerializer reads, so a page of cart lines costs
+        # ! the same number of queries whatever the number of lines
+        return self.select_related(
+            'product_inventory__product',
+        ).defer(
+            'product_inventory__product__variant_matrix',
+        ).prefetch_related(
+            Prefetch(
+                'attribute_values',
+                queryset=ProductAttributeValue.objects.select_related('product_attribute'),
+            )
+        )
+
+    def reprice(self, inventory_ids=None, batch_size=500):
+        # ! aligns the unit price of cart lines with the current sale price of
+        # ! their inventory (every inventory when None): one grouped query,
+        # ! one UPDATE and one DELETE to merge lines that repricing would make
+        # ! equal, then one UPDATE for the prices, per batch of inventories.
+        # ! Repriced lines are flagged with price_changed
+        inventories = ProductInventory.objects.filter(sale_price__isnull=False)
+        if inventory_ids is not None:
+            inventories = inventories.filter(pk__in=inventory_ids)
+        inventory_ids = sorted(inventories.values_list('pk', flat=True))
+        repriced = 0
+        for start in range(0, len(inventory_ids), batch_size):
+            batch_ids = inventory_ids[start:start + batch_size]
+            with transaction.atomic():
+                self._merge_colliding_lines(batch_ids)
+                repriced += self.model.objects.filter(
+                    product_inventory__in=batch_ids,
+                ).exclude(
+                    unit_price=F('product_inventory__sale_price'),
+                ).update(
+                    unit_price=Subquery(ProductInventory.objects.filter(
+                        pk=OuterRef('product_inventory')).values('sale_price')),
+                    price_changed=True,
+                )
+        return repriced
+
+    def _merge_colliding_lines(self, inventory_ids):
+        # ? lines of one selection at different old prices would all get the
+        # ? same new price and break unique_cart_line: the oldest line takes
+        # ? the summed quantity, the others are deleted
+        groups = self.model.objects.filter(
+            product_inventory__in=inventory_ids,
+        ).values('cart', 'product_inventory', 'attribute_signature').annotate(
+            lines=Count('pk'), keep=Min('pk'), total=Sum('quantity'),
+        ).filter(lines__gt=1).order_by()
+        groups = list(groups)
+        if not groups:
+            return
+        kept = {group['keep']: group['total'] for group in groups}
+        merged = Q(pk__in=[])
+        for group in groups:
+            merged |= Q(
+                cart=group['cart'],
+                product_inventory=group['product_inventory'],
+                attribute_signature=group['attribute_signature'],
+            )
+        self.model.objects.filter(merged).exclude(pk__in=kept).delete()
+        self.model.objects.filter(pk__in=kept).update(
+            quantity=Case(
+                *[When(pk=pk, then=Value(total)) for pk, total in kept.items()],
+                output_field=models.PositiveBigIntegerField(),
+            ),
+            price_changed=True,
+        )
+
 
 class CartItem(models.Model):
     cart = models.ForeignKey(
@@ -463,6 +1330,12 @@ class CartItem(models.Model):
         related_name='cart_item_attributes'
 
     )
+    # ! canonical form of attribute_values, see CartItem.signature_for()
+    attribute_signature = models.CharField(max_length=255, blank=True, default='')
+    # ! set when repricing changed unit_price, see CartItemQuerySet.reprice()
+    price_changed = models.BooleanField(default=False, editable=False)
+
+    objects = CartItemQuerySet.as_manager()
 
     # ? the flow is for user to give the selected inventory with attributes
 
@@ -472,10 +1345,25 @@ class CartItem(models.Model):
         # ? the order matters here
 
         ordering = ['-id']
+        constraints = [
+            # ? one line per variant, chosen attributes and price: adding the
+            # ? same selection again increments that line's quantity
+            models.UniqueConstraint(
+                fields=['cart', 'product_inventory', 'attribute_signature', 'unit_price'],
+                name='unique_cart_line',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.product_inventory.product.name} x {self.quantity}: GHS {self.unit_price}"
 
+    @staticmethod
+    def signature_for(attribute_values):
+        # ! sorted, comma separated ids of the chosen attribute values: the
+        # ! same set always gives the same string, whatever the order
+        pks = {getattr(value, 'pk', value) for value in attribute_values}
+        return ','.join(str(pk) for pk in sorted(pks))
+
 
 class Order(models.Model):
 
@@ -0,0 +1,145 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination that seeks on the queryset's own ordering.
+
+    The ordering is read from the queryset (so ProductFilter's `sort` keeps
+    working) and the primary key is appended as the tie-breaker. The cursor
+    carries the ordering values of the first/last row of a page and the next
+    page is fetched with a `WHERE (a, b, pk) > (...)` style filter, so page N
+    costs the same as page 1 and no COUNT(*) is run. NULLs sort last.
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+    # ? used when the queryset itself is not ordered
+    ordering = ('created_at',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering_fields = self.get_ordering(queryset)
+        position, reverse = self.decode_cursor(request)
+
+        if position is not None:
+            # ? a tampered cursor decodes fine but holds values its fields reject
+            try:
+                queryset = queryset.filter(
+                    self.seek(position, before=reverse))
+            except (ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+        queryset = queryset.order_by(*self.order_expressions(reverse))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        # ? walking backwards there is always a next page: the one we came from
+        has_next = has_more if not reverse else position is not None
+        has_previous = has_more if reverse else position is not None
+        self.next_position = self.get_position(
+            results[-1]) if has_next and results else None
+        self.previous_position = self.get_position(
+            results[0]) if has_previous and results else None
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_link(self.next_position, reverse=False),
+            'previous': self.get_link(self.previous_position, reverse=True),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_ordering(self, queryset):
+        # ! [(field, descending), ...] ending with the primary key
+        ordering = queryset.query.order_by or self.ordering
+        pk_names = {'pk', queryset.model._meta.pk.name,
+                    queryset.model._meta.pk.attname}
+        fields = []
+        for field in ordering:
+            if not isinstance(field, str):
+                raise TypeError(
+                    'KeysetPagination only supports ordering by field names')
+            name = field.lstrip('-')
+            fields.append(('pk' if name in pk_names else name, field.startswith('-')))
+        if not fields or fields[-1][0] != 'pk':
+            fields.append(('pk', False))
+        return fields
+
+    def order_expressions(self, reverse):
+        # ? walking backwards flips every direction, NULLs included
+        nulls = {'nulls_first': True} if reverse else {'nulls_last': True}
+        expressions = []
+        for field, descending in self.ordering_fields:
+            if descending != reverse:
+                expressions.append(F(field).desc(**nulls))
+            else:
+                expressions.append(F(field).asc(**nulls))
+        return expressions
+
+    def seek(self, position, before):
+        # ? lexicographic (a, b, pk) > (x, y, z): a > x OR (a = x AND b > y) OR ...
+        condition = Q(pk__in=[])
+        equal = Q()
+        for (field, descending), value in zip(self.ordering_fields, position):
+            if before:
+                step = Q(**{f'{field}__isnull': False}) if value is None else Q(
+                    **{f"{field}__{'gt' if descending else 'lt'}": value})
+            else:
+                step = Q(pk__in=[]) if value is None else Q(
+                    **{f"{field}__{'lt' if descending else 'gt'}": value}
+                ) | Q(**{f'{field}__isnull': True})
+            condition |= equal & step
+            equal &= Q(**{f'{field}__isnull': True}) if value is None else Q(
+                **{field: value})
+        return condition
+
+    def get_position(self, instance):
+        position = []
+        for field, _ in self.ordering_fields:
+            value = instance.pk if field == 'pk' else getattr(instance, field)
+            position.append(
+                value if value is None or isinstance(value, (int, float)) else str(value))
+        return position
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            position, reverse = cursor['p'], bool(cursor['r'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering_fields):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def get_link(self, position, reverse):
+        if position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        cursor = json.dumps({'p': position, 'r': int(reverse)})
+        encoded = urlsafe_b64encode(cursor.encode('utf-8')).decode('ascii')
+        return replace_query_param(url, self.cursor_query_param, encoded)
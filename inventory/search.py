@@ -0,0 +1,212 @@
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from datetime import timedelta
+from inventory.catalog_cache import get_versions
+
+
+TOKEN_RE = re.compile(r'\w+')
+
+# ! how much a term counts depending on the field it was found in
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'brand': 2.0,
+    'product_type': 2.0,
+    'features': 1.0,
+    'attributes': 1.0,
+    'description': 0.5,
+}
+# ? a term only matched through a typo correction scores this fraction
+TYPO_PENALTY = 0.5
+# ? shortest term a typo is corrected for
+TYPO_MIN_LENGTH = 4
+
+
+def tokenize(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return TOKEN_RE.findall(text.lower())
+
+
+def deletions(term):
+    return {term[:index] + term[index + 1:] for index in range(len(term))}
+
+
+def within_one_edit(first, second):
+    # ? one insertion, deletion, substitution or adjacent transposition
+    if abs(len(first) - len(second)) > 1:
+        return False
+    if len(first) > len(second):
+        first, second = second, first
+    start = 0
+    while start < len(first) and first[start] == second[start]:
+        start += 1
+    if len(first) < len(second):
+        return first[start:] == second[start + 1:]
+    return (
+        first[start + 1:] == second[start + 1:]
+        or first[start:start + 2] == second[start:start + 2][::-1]
+        and first[start + 2:] == second[start + 2:]
+    )
+
+
+class SearchIndex:
+    """
+    In-memory inverted index ranked with BM25 over field weighted term
+    frequencies.
+
+    Every query term has to match a document, either as is or, when the term
+    is unknown, through a one edit typo correction looked up in a deletion
+    index (symmetric delete), so no scan over the vocabulary is needed.
+    """
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self, field_weights=FIELD_WEIGHTS):
+        self.field_weights = field_weights
+        self.postings = defaultdict(dict)
+        self.typo_variants = defaultdict(set)
+        self.doc_terms = {}
+        self.doc_lengths = {}
+        self.total_length = 0.0
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def add(self, doc_id, fields):
+        self.remove(doc_id)
+        frequencies = Counter()
+        for field, text in fields.items():
+            weight = self.field_weights.get(field, 1.0)
+            for term in tokenize(text):
+                frequencies[term] += weight
+        for term, frequency in frequencies.items():
+            if term not in self.postings and len(term) >= TYPO_MIN_LENGTH:
+                for variant in deletions(term):
+                    self.typo_variants[variant].add(term)
+            self.postings[term][doc_id] = frequency
+        self.doc_terms[doc_id] = list(frequencies)
+        self.doc_lengths[doc_id] = sum(frequencies.values())
+        self.total_length += self.doc_lengths[doc_id]
+
+    def remove(self, doc_id):
+        # ? typo variants of terms that disappear are left behind, they only
+        # ? ever resolve to terms without postings and are skipped
+        if doc_id not in self.doc_terms:
+            return
+        for term in self.doc_terms.pop(doc_id):
+            postings = self.postings[term]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def expand(self, term, typo_tolerance):
+        # ! [(indexed term, score factor)] a query term matches
+        if term in self.postings:
+            return [(term, 1.0)]
+        if not typo_tolerance or len(term) < TYPO_MIN_LENGTH:
+            return []
+        candidates = set(self.typo_variants.get(term, ()))
+        for variant in deletions(term):
+            candidates.add(variant)
+            candidates.update(self.typo_variants.get(variant, ()))
+        return [
+            (candidate, TYPO_PENALTY) for candidate in candidates
+            if candidate in self.postings and within_one_edit(term, candidate)
+        ]
+
+    def search(self, query, limit=None, typo_tolerance=True):
+        # ! [(doc_id, score)] best first
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self.doc_lengths:
+            return []
+        average_length = self.total_length / len(self.doc_lengths)
+        scores = None
+        for term in terms:
+            term_scores = defaultdict(float)
+            for indexed_term, factor in self.expand(term, typo_tolerance):
+                postings = self.postings[indexed_term]
+                idf = math.log(
+                    1 + (len(self.doc_lengths) - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, frequency in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b *
+                                      self.doc_lengths[doc_id] / average_length)
+                    score = factor * idf * frequency * \
+                        (self.k1 + 1) / (frequency + norm)
+                    term_scores[doc_id] = max(term_scores[doc_id], score)
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {
+                    doc_id: score + term_scores[doc_id]
+                    for doc_id, score in scores.items() if doc_id in term_scores
+                }
+            if not scores:
+                return []
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit] if limit else ranked
+
+
+class CatalogSearch:
+    """
+    Process-wide SearchIndex over ProductSearchDocument rows.
+
+    The first search loads every document; afterwards a change of the
+    documents' version counter only reloads the rows updated since the last
+    sync (with some overlap for transactions that committed late) and drops
+    the documents that no longer exist, read as a list of ids.
+    """
+    sync_overlap = timedelta(minutes=1)
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.index = None
+        self.version = None
+        self.synced_until = None
+
+    def sync(self):
+        from inventory.models import ProductSearchDocument
+
+        version = get_versions([ProductSearchDocument])[0]
+        if self.index is not None and version == self.version:
+            return
+        with self.lock:
+            if self.index is not None and version == self.version:
+                return
+            documents = ProductSearchDocument.objects.all()
+            if self.index is None:
+                self.index = SearchIndex()
+            else:
+                # ? deleted documents (cascaded from their product) leave no
+                # ? row behind to sync, they are found by their missing id
+                existing = set(ProductSearchDocument.objects.values_list('pk', flat=True))
+                for doc_id in [doc_id for doc_id in self.index.doc_lengths if doc_id not in existing]:
+                    self.index.remove(doc_id)
+                if self.synced_until is not None:
+                    documents = documents.filter(
+                        updated_at__gte=self.synced_until - self.sync_overlap)
+            for document in documents.iterator():
+                if document.is_active:
+                    self.index.add(document.product_id, document.fields)
+                else:
+                    self.index.remove(document.product_id)
+                if self.synced_until is None or document.updated_at > self.synced_until:
+                    self.synced_until = document.updated_at
+            self.version = version
+
+    def reset(self):
+        with self.lock:
+            self.index = None
+            self.version = None
+            self.synced_until = None
+
+    def search(self, query, limit=None, typo_tolerance=True):
+        self.sync()
+        with self.lock:
+            return self.index.search(query, limit, typo_tolerance)
+
+
+catalog_search = CatalogSearch()
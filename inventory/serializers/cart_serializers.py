@@ -1,6 +1,8 @@
 from rest_framework import serializers
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
 from inventory import models
-from django.db.models import Sum, F
+from inventory.cart_cache import get_inventory_attribute_ids, invalidate_cart
 from utils.validate_attribute_values import validate_attribute_values
 from .product_attribute_values_serializer import ProductAttributeValuesSerializer
 
@@ -35,7 +37,7 @@ class CartItemSerializer(serializers.ModelSerializer):
             return 0
 
 
-# todo do a get or create for cart
+# ! reads the figures annotated by Cart.objects.with_summary()
 class CartSerializer(serializers.ModelSerializer):
     class Meta:
         model = models.Cart
@@ -44,46 +46,67 @@ class CartSerializer(serializers.ModelSerializer):
             'user',
             'cart_total_price',
             'created_at',
-            'items_count'
+            'items_count',
+            'price_changes_count'
         ]
     id = serializers.UUIDField(read_only=True)
     cart_total_price = serializers.SerializerMethodField()
     items_count = serializers.SerializerMethodField()
+    # ? lines repriced since the shopper last touched them
+    price_changes_count = serializers.SerializerMethodField()
 
     def get_cart_total_price(self, cart):
-        total_price = cart.cart_items.aggregate(
-            total=Sum(F('quantity') * F('unit_price'))
-        )['total']
-        return total_price if total_price is not None else 0
+        return cart.cart_total_price
 
     def get_items_count(self, cart):
-        count = cart.user.cart.cart_items.count()
-        return count if count is not None else 0
+        return cart.items_count
+
+    def get_price_changes_count(self, cart):
+        return cart.price_changes_count
+
+
+def invalid_attribute_message(chosen_attribute):
+    return f"Selected product does not have the chosen {chosen_attribute.product_attribute.name}: {chosen_attribute.description} - {chosen_attribute.attribute_value} "
+
+
+class AttributeValuesField(serializers.ListField):
+    # ! attribute value ids in, instances (with their product_attribute) out,
+    # ! resolved with one query instead of one per id
+    child = serializers.IntegerField()
+    default_error_messages = {
+        'does_not_exist': 'Invalid pk "{pk_value}" - object does not exist.',
+    }
+
+    def to_internal_value(self, data):
+        pks = list(dict.fromkeys(super().to_internal_value(data)))
+        values = models.ProductAttributeValue.objects.select_related(
+            'product_attribute').in_bulk(pks)
+        for pk in pks:
+            if pk not in values:
+                self.fail('does_not_exist', pk_value=pk)
+        return [values[pk] for pk in pks]
+
+    def to_representation(self, value):
+        return [attribute_value.pk for attribute_value in value.all()]
 
 
 class AddCartItemSerializer(serializers.ModelSerializer):
+    # ? required and non-empty, as the blank=False m2m field it replaces
+    attribute_values = AttributeValuesField(allow_empty=False)
 
     class Meta:
         model = models.CartItem
         fields = '__all__'
+        read_only_fields = ['attribute_signature']
 
     def validate(self, data):
-
+        # ? one set comparison against the inventory's cached attribute ids
         chosen_attributes = data['attribute_values']
-        product_inv = data['product_inventory']
-
-        try:
-            product_inventory = models.ProductInventory.objects.get(
-                pk=product_inv.id)
-            for chosen_attribute in chosen_attributes:
-                is_valid_attribute = validate_attribute_values(
-                    chosen_attribute, product_inventory)
-                if not is_valid_attribute:
-                    raise serializers.ValidationError(
-                        f"Selected product does not have the chosen {chosen_attribute.product_attribute.name}: {chosen_attribute.description} - {chosen_attribute.attribute_value} "
-                    )
-        except models.ProductInventory.DoesNotExist:
-            raise serializers.ValidationError("Product inventory not found.")
+        product_inventory = data['product_inventory']
+        valid_attribute_ids = get_inventory_attribute_ids(
+            [product_inventory.pk])[product_inventory.pk]
+        for chosen_attribute in validate_attribute_values(chosen_attributes, valid_attribute_ids):
+            raise serializers.ValidationError(invalid_attribute_message(chosen_attribute))
         return data
 
     def save(self, **kwargs):
@@ -92,35 +115,162 @@ class AddCartItemSerializer(serializers.ModelSerializer):
         quantity = self.validated_data['quantity']
         chosen_attributes = self.validated_data['attribute_values']
         unit_price = self.validated_data['unit_price']
-        try:
-            # increase item in cart quantity
-            # todo check if the attribute given if the same if so increase the quantity else add the same product with the differnt attributes
-            # todo, first approach(simple one) - in the cart item query , try to get/filter out the chosen attrubutes as well
-            cart_item = models.CartItem.objects.get(
-                cart=cart_id,
-                product_inventory=product_inventory,
-                attribute_values__in=chosen_attributes,
-                unit_price=unit_price
-            )
-            cart_item.quantity += quantity
-            self.instance = cart_item.save()
-        except models.CartItem.DoesNotExist:
-            # create new item
-            # ? object created has to stored in self.instance so that instance can be returned from the try except block regardless of the outcome in the try except block
-            created_item = models.CartItem.objects.create(
+        # ! a line is identified by its exact attribute set through the stored
+        # ! signature: an existing line gets an F() increment, concurrent first
+        # ! adds are settled by the unique_cart_line constraint in get_or_create
+        with transaction.atomic():
+            cart_item, created = models.CartItem.objects.get_or_create(
                 cart_id=cart_id,
                 product_inventory=product_inventory,
-                quantity=quantity,
-                unit_price=unit_price
+                attribute_signature=models.CartItem.signature_for(chosen_attributes),
+                unit_price=unit_price,
+                defaults={'quantity': quantity},
             )
-            created_item.attribute_values.set(chosen_attributes)
-            self.instance = created_item
+            if created:
+                cart_item.attribute_values.set(chosen_attributes)
+            else:
+                models.CartItem.objects.filter(pk=cart_item.pk).update(
+                    quantity=F('quantity') + quantity, price_changed=False)
+                cart_item.refresh_from_db(fields=['quantity'])
+        self.instance = cart_item
         return self.instance
 
 
+class CartLineSerializer(serializers.Serializer):
+    product_inventory = serializers.IntegerField()
+    attribute_values = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=True)
+    quantity = serializers.IntegerField(min_value=1)
+    # ? defaults to the inventory's sale price
+    unit_price = serializers.DecimalField(
+        max_digits=7, decimal_places=2, required=False)
+
+
+def resolve_cart_lines(lines):
+    # ! validates CartLineSerializer data with three set-based lookups for
+    # ! the whole batch (inventories, attribute values, valid attribute ids):
+    # ! every line comes back with its errors, or with its quantity and the
+    # ! (inventory, attribute signature, unit price) key identifying a cart line
+    inventories = models.ProductInventory.objects.only('pk', 'sale_price').in_bulk(
+        {line['product_inventory'] for line in lines})
+    attribute_values = models.ProductAttributeValue.objects.select_related(
+        'product_attribute').in_bulk(
+        {pk for line in lines for pk in line['attribute_values']})
+    valid_attribute_ids = get_inventory_attribute_ids(list(inventories))
+
+    resolved = []
+    for line in lines:
+        inventory = inventories.get(line['product_inventory'])
+        if inventory is None:
+            resolved.append({'errors': ['Product inventory not found.']})
+            continue
+        unknown = [pk for pk in line['attribute_values'] if pk not in attribute_values]
+        if unknown:
+            resolved.append({'errors': [
+                f'Invalid pk "{pk}" - object does not exist.' for pk in unknown]})
+            continue
+        chosen_attributes = [attribute_values[pk] for pk in line['attribute_values']]
+        invalid = validate_attribute_values(chosen_attributes, valid_attribute_ids[inventory.pk])
+        if invalid:
+            resolved.append({'errors': [
+                invalid_attribute_message(chosen_attribute) for chosen_attribute in invalid]})
+            continue
+        unit_price = line.get('unit_price')
+        if unit_price is None:
+            unit_price = inventory.sale_price
+        if unit_price is None:
+            resolved.append({'errors': ['No price available.']})
+            continue
+        resolved.append({
+            'key': (
+                inventory.pk,
+                models.CartItem.signature_for(chosen_attributes),
+                unit_price,
+            ),
+            'quantity': line['quantity'],
+        })
+    return resolved
+
+
+class BulkAddCartItemSerializer(serializers.Serializer):
+    """
+    Adds many lines to a cart at once: every line is validated with a few
+    set-based queries for the whole batch, valid lines are written in one
+    transaction (one bulk insert for the new lines and their attributes, one
+    UPDATE incrementing the existing ones) and every line gets a status.
+    """
+    items = CartLineSerializer(many=True, allow_empty=False, max_length=100)
+
+    def save(self, **kwargs):
+        cart_id = self.context['cart_pk']
+        results = []
+        quantities = {}
+        for index, line in enumerate(resolve_cart_lines(self.validated_data['items'])):
+            if 'errors' in line:
+                results.append({'index': index, 'status': 'invalid', 'errors': line['errors']})
+                continue
+            # ? lines repeating a selection within the batch are summed
+            quantities[line['key']] = quantities.get(line['key'], 0) + line['quantity']
+            results.append({'index': index, 'status': None, 'key': line['key']})
+
+        with transaction.atomic():
+            # ? concurrent batches on the same cart are applied one at a time
+            cart = models.Cart.objects.select_for_update().only('pk', 'user_id').get(pk=cart_id)
+            # ? bulk writes send no signals, the badge count is dropped here
+            transaction.on_commit(lambda: invalidate_cart(cart.user_id))
+            existing = {}
+            if quantities:
+                lookup = Q()
+                for inventory_id, signature, unit_price in quantities:
+                    lookup |= Q(product_inventory_id=inventory_id,
+                                attribute_signature=signature, unit_price=unit_price)
+                existing = {
+                    (item.product_inventory_id, item.attribute_signature, item.unit_price): item.pk
+                    for item in models.CartItem.objects.filter(lookup, cart_id=cart_id).only(
+                        'pk', 'product_inventory_id', 'attribute_signature', 'unit_price')
+                }
+            if existing:
+                models.CartItem.objects.filter(pk__in=existing.values()).update(
+                    quantity=F('quantity') + Case(
+                        *[When(pk=pk, then=Value(quantities[key])) for key, pk in existing.items()],
+                        output_field=models.CartItem._meta.get_field('quantity'),
+                    ), price_changed=False)
+            new_items = {
+                key: models.CartItem(
+                    cart_id=cart_id,
+                    product_inventory_id=key[0],
+                    attribute_signature=key[1],
+                    unit_price=key[2],
+                    quantity=quantity,
+                )
+                for key, quantity in quantities.items() if key not in existing
+            }
+            models.CartItem.objects.bulk_create(new_items.values())
+            Attribute = models.CartItem.attribute_values.through
+            Attribute.objects.bulk_create([
+                Attribute(cartitem_id=item.pk, productattributevalue_id=int(pk))
+                for (_, signature, _), item in new_items.items()
+                for pk in signature.split(',') if pk
+            ])
+
+        for result in results:
+            key = result.pop('key', None)
+            if key is not None:
+                if key in existing:
+                    result.update(status='updated', id=existing[key])
+                else:
+                    result.update(status='created', id=new_items[key].pk)
+        return results
+
+
 class UpdateCartItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = models.CartItem
         fields = [
             'quantity'
         ]
+
+    # ! a shopper changing the quantity has seen the repriced line
+    def update(self, instance, validated_data):
+        instance.price_changed = False
+        return super().update(instance, validated_data)
@@ -1,5 +1,7 @@
+from mptt.utils import get_cached_trees
 from rest_framework import serializers
 from inventory import models
+from inventory.category_index import category_index
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -20,3 +22,45 @@ class CategorySerializer(serializers.ModelSerializer):
         children = category.get_children()
         serializer = CategorySerializer(children, many=True)
         return serializer.data
+
+
+# ! flat category reference used inside product payloads: no subtree, the
+# ! ancestors come as a breadcrumb read from the in-memory category index
+class CategoryReferenceSerializer(serializers.ModelSerializer):
+    breadcrumb = serializers.SerializerMethodField()
+
+    class Meta:
+        model = models.Category
+        fields = [
+            'id',
+            'name',
+            'slug',
+            'breadcrumb',
+        ]
+
+    def get_breadcrumb(self, category):
+        # ? the view puts the index in the context once per request
+        tree = self.context.get('category_tree') or category_index.get()
+        node = tree.by_id.get(category.pk)
+        if node is None:
+            return []
+        return [
+            {'id': ancestor.id, 'name': ancestor.name, 'slug': ancestor.slug}
+            for ancestor in tree.ancestors(node)
+        ]
+
+
+def serialize_category_forest():
+    # ! the whole forest from a single query: get_cached_trees() links the
+    # ! nodes in memory so get_children() never goes back to the database
+    # ? returns (root categories, every category in tree order), each one
+    # ? serialized with its subtree
+    roots = CategorySerializer(
+        get_cached_trees(models.Category.objects.order_by('tree_id', 'lft')), many=True).data
+    categories = []
+    pending = list(reversed(roots))
+    while pending:
+        category = pending.pop()
+        categories.append(category)
+        pending.extend(reversed(category['children']))
+    return roots, categories
@@ -46,7 +46,9 @@ class CreateOrderSerializer(serializers.ModelSerializer):
         fields = ['cart', 'user']
 
     def validate_cart(self, cart: serializers.UUIDField):
-        if CartItem.objects.filter(cart=cart).count() == 0:
+        # ! only the requesting user's own cart can be ordered, someone else's
+        # ! cart reads as empty
+        if not CartItem.objects.filter(cart=cart, cart__user=self.context['user_pk']).exists():
             raise ValidationError('Cart is empty', 403)
         return cart
 
@@ -59,7 +61,7 @@ class CreateOrderSerializer(serializers.ModelSerializer):
 
             print('HERE-->>', order)
             cart_items = CartItem.objects.select_related(
-                'product_inventory').filter(cart=cart_id)
+                'product_inventory').filter(cart=cart_id, cart__user=user)
             order_items = [
                 OrderItem(
                     order=order,
@@ -74,5 +76,5 @@ class CreateOrderSerializer(serializers.ModelSerializer):
             for item in order_items:
                 assign_permissions(user, item, assign_perms)
 
-            Cart.objects.filter(pk=cart_id).delete()
+            Cart.objects.filter(pk=cart_id, user=user).delete()
             return order
@@ -0,0 +1,28 @@
+from rest_framework import serializers
+from inventory import models
+
+
+class ProductCardSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='product_id', read_only=True)
+    avg_rating = serializers.SerializerMethodField()
+    total_rating = serializers.IntegerField(source='rating_count')
+
+    class Meta:
+        model = models.ProductCard
+        fields = [
+            'id',
+            'name',
+            'slug',
+            'brand_name',
+            'min_price',
+            'max_price',
+            'default_sku',
+            'feature_image',
+            'avg_rating',
+            'total_rating',
+            'in_stock',
+            'category_path',
+        ]
+
+    def get_avg_rating(self, card: models.ProductCard):
+        return int(card.rating_avg)
@@ -9,6 +9,8 @@ class ProductInventorySerializer(serializers.ModelSerializer):
         many=True, read_only=True, source='attribute_values')
     images = MediaSerializer(many=True)
     discount_percentage = serializers.SerializerMethodField(read_only=True)
+    # ? querysets serialized here select_related('stock')
+    available_units = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = models.ProductInventory
@@ -23,7 +25,8 @@ class ProductInventorySerializer(serializers.ModelSerializer):
             'is_active',
             'is_default',
             'images',
-            'discount_percentage'
+            'discount_percentage',
+            'available_units',
         ]
         depth = 2
 
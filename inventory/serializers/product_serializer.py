@@ -2,11 +2,11 @@ from rest_framework import serializers
 from inventory import models
 from .product_inventory_serializer import ProductInventorySerializer
 from .brand_serializer import BrandSerializer
-from django.db.models.aggregates import Avg
-from .category_serializer import CategorySerializer
+from .category_serializer import CategoryReferenceSerializer
+from .sparse_fields import SparseFieldsMixin
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     inventory = ProductInventorySerializer(many=True, source='inventories')
     brand = BrandSerializer()
     # todo: num_of_ratings
@@ -16,8 +16,8 @@ class ProductSerializer(serializers.ModelSerializer):
     total_rating = serializers.SerializerMethodField()
     min_price = serializers.DecimalField(
         max_digits=10, decimal_places=2, read_only=True)
-    category = CategorySerializer(many=True)
-    is_in_wishlist = serializers.BooleanField(read_only=True)
+    category = CategoryReferenceSerializer(many=True)
+    is_in_wishlist = serializers.SerializerMethodField()
 
     class Meta:
         model = models.Product
@@ -35,12 +35,71 @@ class ProductSerializer(serializers.ModelSerializer):
             'description',
             'category',
             'inventory',
+            'variant_matrix',
         ]
         depth = 1
 
+    # ? both read the stored rating summary kept up to date by Review.save()
     def get_avg_rating(self, product: models.Product):
-        avg_rating = product.reviews.aggregate(rating=Avg('rating'))['rating']
-        return int(avg_rating) if avg_rating else 0
+        return int(product.rating_avg)
 
     def get_total_rating(self, product: models.Product):
-        return product.reviews.count()
+        return product.rating_count
+
+    # ? the view loads the user's wishlisted product ids once per request
+    def get_is_in_wishlist(self, product: models.Product):
+        return product.pk in self.context.get('wishlist_product_ids', ())
+
+
+# ! compact representation for the listing page: the card columns come from
+# ! the ProductCard row joined in by Product.objects.with_listing_plan(),
+# ! nested relations are only serialized when asked for with ?expand=
+class ProductListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    brand = BrandSerializer()
+    avg_rating = serializers.SerializerMethodField()
+    total_rating = serializers.SerializerMethodField()
+    min_price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, read_only=True)
+    max_price = serializers.DecimalField(
+        max_digits=7, decimal_places=2, read_only=True)
+    default_sku = serializers.CharField(
+        read_only=True, source='card.default_sku', default=None)
+    feature_image = serializers.ImageField(
+        read_only=True, source='card.feature_image', default=None)
+    in_stock = serializers.BooleanField(
+        read_only=True, source='card.in_stock', default=False)
+    is_in_wishlist = serializers.SerializerMethodField()
+    category = CategoryReferenceSerializer(many=True)
+    inventory = ProductInventorySerializer(many=True, source='inventories')
+
+    class Meta:
+        model = models.Product
+        fields = [
+            'id',
+            'name',
+            'slug',
+            'uuid',
+            'is_in_wishlist',
+            'brand',
+            'min_price',
+            'max_price',
+            'default_sku',
+            'feature_image',
+            'in_stock',
+            'avg_rating',
+            'total_rating',
+            'category',
+            'features',
+            'inventory',
+        ]
+        expandable_fields = models.PRODUCT_RELATIONS
+        depth = 1
+
+    def get_avg_rating(self, product: models.Product):
+        return int(product.rating_avg)
+
+    def get_total_rating(self, product: models.Product):
+        return product.rating_count
+
+    def get_is_in_wishlist(self, product: models.Product):
+        return product.pk in self.context.get('wishlist_product_ids', ())
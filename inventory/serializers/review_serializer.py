@@ -8,13 +8,21 @@ class ReviewSerializer(serializers.ModelSerializer):
         model = models.Review
         fields = '__all__'
 
+    def validate_rating(self, rating):
+        if rating not in models.RATING_STARS:
+            raise serializers.ValidationError('Rating must be between 1 and 5.')
+        return rating
+
+    # ? Review.save() keeps the product rating summary in step on both paths
     def save(self, **kwargs):
         try:
             user_pk = self.context['user_pk']
             product_slug = self.context['product_slug']
             review = models.Review.objects.get(user=user_pk, product__slug=product_slug)
             review.comment = self.validated_data['comment']
-            self.instance = review.save()
+            review.rating = self.validated_data.get('rating', review.rating)
+            review.save()
+            self.instance = review
 
         except models.Review.DoesNotExist:
             self.instance = models.Review.objects.create(**self.validated_data)
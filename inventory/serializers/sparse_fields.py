@@ -0,0 +1,21 @@
+class SparseFieldsMixin:
+    """
+    Trims a serializer to the `fields` and `expand` sets found in its context.
+
+    `fields` limits the top level fields, `expand` opts into the nested
+    relations listed in `Meta.expandable_fields`, which are left out otherwise.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        expand = self.context.get('expand', ())
+        for name in getattr(self.Meta, 'expandable_fields', ()):
+            if name not in expand:
+                fields.pop(name, None)
+
+        requested = self.context.get('fields')
+        if requested:
+            for name in list(fields):
+                if name not in requested:
+                    fields.pop(name)
+        return fields
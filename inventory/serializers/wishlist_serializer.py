@@ -1,5 +1,7 @@
+from django.db import transaction
 from rest_framework import serializers
 from inventory import models
+from inventory.wishlist_cache import invalidate_wishlist
 
 
 class WishlistSerializer(serializers.ModelSerializer):
@@ -35,4 +37,8 @@ class CreateWishlistItemSerializer(serializers.Serializer):
                 product=validated_data['product']
             )
             self.instance = wishlist
+        # ! dropped once the toggle is committed, so a read racing the write
+        # ! cannot refill the cache with the old set
+        user_id = validated_data['wishlist'].user_id
+        transaction.on_commit(lambda: invalidate_wishlist(user_id))
         return self.instance
@@ -0,0 +1,74 @@
+import pytest
+from django.core.cache import cache
+from django.utils import timezone
+from inventory import models
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # ? cached responses would otherwise outlive the test database
+    cache.clear()
+
+
+@pytest.fixture
+def catalog(db):
+    root = models.Category.objects.create(name='Clothing')
+    child = models.Category.objects.create(name='Shirts', parent=root)
+    models.Category.objects.create(name='T-Shirts', parent=child)
+    size = models.ProductAttribute.objects.create(name='Size')
+    colour = models.ProductAttribute.objects.create(name='Colour')
+    return {
+        'brand': models.Brand.objects.create(name='Acme'),
+        'product_type': models.ProductType.objects.create(name='Shirt'),
+        'category': child,
+        'feature': models.ProductFeature.objects.create(
+            feature_name='Material', feature_value='Cotton'),
+        'attribute_values': [
+            models.ProductAttributeValue.objects.create(
+                product_attribute=size, attribute_value='M'),
+            models.ProductAttributeValue.objects.create(
+                product_attribute=colour, attribute_value='Red'),
+        ],
+    }
+
+
+@pytest.fixture
+def make_product(catalog, django_user_model):
+    # ? builds a fully populated product: two inventories, images, stock,
+    # ? attribute values, a feature and a review
+    reviewer = django_user_model.objects.create_user(
+        email='reviewer@example.com', password='password')
+
+    def _make_product(name='Shirt', inventories=2):
+        product = models.Product.objects.create(
+            name=name,
+            description='A shirt',
+            brand=catalog['brand'],
+            product_type=catalog['product_type'],
+        )
+        product.category.add(catalog['category'])
+        product.features.add(catalog['feature'])
+        for index in range(inventories):
+            inventory = models.ProductInventory.objects.create(
+                product=product,
+                retail_price=20,
+                store_price=15,
+                sale_price=10 + index,
+                is_default=index == 0,
+            )
+            inventory.attribute_values.set(catalog['attribute_values'])
+            models.Media.objects.create(
+                product_inventory=inventory,
+                image='product_images/shirt.jpg',
+                is_feature=True,
+            )
+            models.Stock.objects.create(
+                product_inventory=inventory,
+                last_checked=timezone.now(),
+                units=5,
+            )
+        models.Review.objects.create(
+            user=reviewer, product=product, comment='Nice', rating=4)
+        return product
+
+    return _make_product
@@ -0,0 +1,63 @@
+from inventory import models
+from inventory.autocomplete import PrefixIndex, catalog_autocomplete
+from inventory.catalog_cache import bump_version
+
+
+def test_prefix_index_ranks_by_weight():
+    index = PrefixIndex([
+        (1, 'Wool jumper', 'jumper'),
+        (5, 'Wool socks', 'socks'),
+        (3, 'Jumpsuit', 'jumpsuit'),
+    ])
+    assert index.lookup('wo') == ['socks', 'jumper']
+    assert index.lookup('JUMP') == ['jumpsuit', 'jumper']
+    assert index.lookup('wool j') == ['jumper']
+    assert index.lookup('wo', limit=1) == ['socks']
+    assert index.lookup('x') == []
+
+
+def test_autocomplete_endpoint(client, make_product, django_assert_num_queries):
+    catalog_autocomplete.reset()
+    make_product('Shirt dress')
+    popular = make_product('Oxford shirt')
+    models.Stock.objects.filter(
+        product_inventory__product=popular).update(units_sold=7)
+
+    response = client.get('/api/products/autocomplete/', {'q': 'shi'})
+    assert response.status_code == 200
+    assert [(item['type'], item['name']) for item in response.data] == [
+        ('product', 'Oxford shirt'),
+        ('category', 'Shirts'),
+        ('product', 'Shirt dress'),
+        ('category', 'T-Shirts'),
+    ]
+
+    # ? answered from memory while the catalog is unchanged
+    with django_assert_num_queries(0):
+        response = client.get('/api/products/autocomplete/', {'q': 'ac', 'limit': 1})
+    assert response.data == [
+        {'type': 'brand', 'id': popular.brand_id, 'name': 'Acme', 'slug': None}]
+
+
+def test_autocomplete_rebuilds_without_blocking_readers(make_product, django_assert_num_queries):
+    catalog_autocomplete.reset()
+    popular = make_product('Shirt dress')
+    make_product('Oxford shirt')
+    assert catalog_autocomplete.suggest('shirt d') != []
+
+    # ? sales only move the weights at the next periodic rebuild
+    models.Stock.objects.filter(
+        product_inventory__product=popular).update(units_sold=7)
+    with django_assert_num_queries(0):
+        assert catalog_autocomplete.suggest('shi', 1)[0]['name'] == 'Oxford shirt'
+    catalog_autocomplete.built_at -= catalog_autocomplete.popularity_refresh + 1
+    assert catalog_autocomplete.suggest('shi', 1)[0]['name'] == 'Shirt dress'
+
+    # ? while another request rebuilds, the previous index keeps answering
+    catalog_autocomplete.lock.acquire()
+    try:
+        bump_version(models.Product)
+        with django_assert_num_queries(0):
+            assert catalog_autocomplete.suggest('shi', 1)[0]['name'] == 'Shirt dress'
+    finally:
+        catalog_autocomplete.lock.release()
@@ -0,0 +1,246 @@
+from decimal import Decimal
+import pytest
+from inventory import models
+
+
+# ? count, lines with their inventory and product, attribute values
+CART_ITEMS_QUERIES = 3
+CART_ITEM_DETAIL_QUERIES = 2
+
+@pytest.fixture
+def shopper(client, django_user_model):
+    user = django_user_model.objects.create_user(
+        email='shopper@example.com', password='password')
+    client.force_authenticate(user)
+    return user
+
+
+def add_item(client, cart_id, inventory, quantity=1):
+    return client.post(f'/api/cart/{cart_id}/items/', {
+        'cart': cart_id,
+        'product_inventory': inventory.pk,
+        'quantity': quantity,
+        'unit_price': inventory.sale_price,
+        'attribute_values': [value.pk for value in inventory.attribute_values.all()],
+    })
+
+
+def test_cart_is_created_on_first_add(client, shopper, make_product, django_assert_num_queries, django_capture_on_commit_callbacks):
+    inventory = make_product().inventories.order_by('pk').first()
+
+    with django_assert_num_queries(1):
+        response = client.get('/api/cart/')
+    cart_id = response.data['id']
+    assert response.data['items_count'] == 0
+    assert not models.Cart.objects.exists()
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = add_item(client, cart_id, inventory, quantity=2)
+    assert response.status_code == 201
+    assert str(models.Cart.objects.get(user=shopper).pk) == cart_id
+
+    response = client.get('/api/cart/count/')
+    assert response.data == {'items_count': 1}
+    with django_assert_num_queries(0):
+        client.get('/api/cart/count/')
+
+    with django_assert_num_queries(1):
+        response = client.get('/api/cart/')
+    assert (response.data['id'], response.data['items_count']) == (cart_id, 1)
+    assert response.data['cart_total_price'] == 2 * inventory.sale_price
+
+
+def test_items_cannot_be_added_to_another_cart(client, shopper, make_product, django_user_model):
+    other = django_user_model.objects.create_user(email='other@example.com', password='password')
+    cart = models.Cart.objects.create(user=other)
+    inventory = make_product().inventories.first()
+
+    assert add_item(client, cart.pk, inventory).status_code == 404
+    assert add_item(client, models.Cart.id_for_user(other.pk), inventory).status_code == 404
+
+
+def test_lazy_cart_ids_are_keyed_with_the_secret_key(settings):
+    cart_id = models.Cart.id_for_user(1)
+    assert cart_id.version == 4 and cart_id != models.Cart.id_for_user(2)
+    settings.SECRET_KEY = 'another-secret'
+    assert models.Cart.id_for_user(1) != cart_id
+
+
+def test_adding_the_same_selection_merges_lines(client, shopper, catalog, make_product):
+    inventory = make_product().inventories.order_by('pk').first()
+    cart_id = client.get('/api/cart/').data['id']
+
+    add_item(client, cart_id, inventory, quantity=2)
+    add_item(client, cart_id, inventory, quantity=3)
+    [line] = models.CartItem.objects.filter(cart=cart_id)
+    assert line.quantity == 5
+    assert line.attribute_signature == models.CartItem.signature_for(catalog['attribute_values'])
+
+    # ? a different attribute set is a line of its own
+    inventory.attribute_values.remove(catalog['attribute_values'][1])
+    add_item(client, cart_id, inventory)
+    assert models.CartItem.objects.filter(cart=cart_id).count() == 2
+
+
+def test_add_to_cart_validates_attributes_as_a_set(client, shopper, catalog, make_product, django_capture_on_commit_callbacks):
+    inventory = make_product().inventories.order_by('pk').first()
+    cart_id = client.get('/api/cart/').data['id']
+    size = catalog['attribute_values'][0]
+    add_item(client, cart_id, inventory)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        inventory.attribute_values.remove(size)
+    response = client.post(f'/api/cart/{cart_id}/items/', {
+        'cart': cart_id,
+        'product_inventory': inventory.pk,
+        'quantity': 1,
+        'unit_price': inventory.sale_price,
+        'attribute_values': [size.pk],
+    })
+    assert response.status_code == 400
+    assert response.data['errors'][0]['detail'] == (
+        f"Selected product does not have the chosen Size: {size.description} - M ")
+
+    response = client.post(f'/api/cart/{cart_id}/items/', {
+        'cart': cart_id,
+        'product_inventory': inventory.pk,
+        'quantity': 1,
+        'unit_price': inventory.sale_price,
+        'attribute_values': [],
+    }, format='json')
+    assert response.status_code == 400
+    assert response.data['errors'][0]['attr'] == 'attribute_values'
+
+
+def test_bulk_add_reports_every_line(client, shopper, catalog, make_product, django_capture_on_commit_callbacks):
+    first, second = make_product().inventories.order_by('pk')
+    cart_id = client.get('/api/cart/').data['id']
+    add_item(client, cart_id, first)
+    attributes = [value.pk for value in catalog['attribute_values']]
+    other_size = models.ProductAttributeValue.objects.create(
+        product_attribute=catalog['attribute_values'][0].product_attribute, attribute_value='XL')
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.post(f'/api/cart/{cart_id}/items/bulk/', {'items': [
+            {'product_inventory': first.pk, 'attribute_values': attributes,
+             'quantity': 2, 'unit_price': str(first.sale_price)},
+            {'product_inventory': second.pk, 'attribute_values': attributes, 'quantity': 1},
+            {'product_inventory': second.pk, 'attribute_values': [other_size.pk], 'quantity': 1},
+            {'product_inventory': 0, 'attribute_values': [], 'quantity': 1},
+        ]}, format='json')
+    assert response.status_code == 200
+    assert [line['status'] for line in response.data['items']] == [
+        'updated', 'created', 'invalid', 'invalid']
+
+    lines = {item.product_inventory_id: item for item in models.CartItem.objects.filter(cart=cart_id)}
+    assert lines[first.pk].quantity == 3
+    assert (lines[second.pk].quantity, lines[second.pk].unit_price) == (1, second.sale_price)
+    assert set(lines[second.pk].attribute_values.values_list('pk', flat=True)) == set(attributes)
+    assert client.get('/api/cart/count/').data == {'items_count': 2}
+
+
+def test_sale_price_changes_reprice_cart_lines(client, shopper, make_product, django_assert_num_queries, django_capture_on_commit_callbacks):
+    first, second = make_product().inventories.order_by('pk')
+    cart_id = client.get('/api/cart/').data['id']
+    add_item(client, cart_id, first, quantity=2)
+    add_item(client, cart_id, second)
+    # ? a line added at an older price collides with the first once repriced
+    models.CartItem.objects.filter(product_inventory=first).update(unit_price=9)
+    add_item(client, cart_id, first, quantity=3)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        models.ProductInventory.objects.filter(pk=first.pk).update(sale_price=8)
+    [line] = models.CartItem.objects.filter(product_inventory=first)
+    assert (line.quantity, line.unit_price, line.price_changed) == (5, 8, True)
+    assert not models.CartItem.objects.get(product_inventory=second).price_changed
+
+    response = client.get('/api/cart/')
+    assert response.data['price_changes_count'] == 1
+    assert response.data['cart_total_price'] == 5 * 8 + second.sale_price
+
+    # ? lines already at the current price are left alone: the inventory ids,
+    # ? the savepoint and its release, the duplicate lookup and one UPDATE that
+    # ? matches nothing
+    with django_assert_num_queries(5):
+        assert models.CartItem.objects.reprice() == 0
+
+    client.patch(f'/api/cart/{cart_id}/items/{line.pk}/', {'quantity': 1})
+    assert client.get('/api/cart/').data['price_changes_count'] == 0
+
+
+def test_cart_items_cost_a_fixed_number_of_queries(client, shopper, make_product, django_assert_num_queries):
+    cart_id = client.get('/api/cart/').data['id']
+    for index in range(3):
+        for inventory in make_product(name=f'Shirt {index}').inventories.all():
+            add_item(client, cart_id, inventory)
+    line = models.CartItem.objects.filter(cart=cart_id).first()
+
+    with django_assert_num_queries(CART_ITEMS_QUERIES):
+        response = client.get(f'/api/cart/{cart_id}/items/')
+    assert response.data['count'] == 6
+    item = response.data['results'][0]
+    assert item['product_name'].startswith('Shirt')
+    assert [value['product_attribute']['name'] for value in item['specification']]
+
+    with django_assert_num_queries(CART_ITEM_DETAIL_QUERIES):
+        response = client.get(f'/api/cart/{cart_id}/items/{line.pk}/')
+    assert response.data['product_slug'] == line.product_inventory.product.slug
+
+
+def test_bulk_add_reports_lines_without_a_price(client, shopper, catalog, make_product):
+    first, second = make_product().inventories.order_by('pk')
+    models.ProductInventory.objects.filter(pk=second.pk).update(sale_price=None)
+    cart_id = client.get('/api/cart/').data['id']
+    attributes = [value.pk for value in catalog['attribute_values']]
+
+    response = client.post(f'/api/cart/{cart_id}/items/bulk/', {'items': [
+        {'product_inventory': first.pk, 'attribute_values': attributes, 'quantity': 1},
+        {'product_inventory': second.pk, 'attribute_values': attributes, 'quantity': 1},
+    ]}, format='json')
+    assert response.status_code == 200
+    assert [line['status'] for line in response.data['items']] == ['created', 'invalid']
+    assert response.data['items'][1]['errors'] == ['No price available.']
+    assert list(models.CartItem.objects.filter(cart=cart_id).values_list(
+        'product_inventory', flat=True)) == [first.pk]
+
+
+def test_saves_keeping_the_sale_price_leave_cart_lines_alone(client, shopper, make_product, django_capture_on_commit_callbacks):
+    inventory = make_product().inventories.order_by('pk').first()
+    cart_id = client.get('/api/cart/').data['id']
+    client.post(f'/api/cart/{cart_id}/items/', {
+        'cart': cart_id,
+        'product_inventory': inventory.pk,
+        'quantity': 1,
+        'unit_price': '9.50',
+        'attribute_values': [value.pk for value in inventory.attribute_values.all()],
+    })
+
+    with django_capture_on_commit_callbacks(execute=True):
+        inventory.upc = '123456789012'
+        inventory.save()
+    line = models.CartItem.objects.get(cart=cart_id)
+    assert (line.unit_price, line.price_changed) == (Decimal('9.50'), False)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        inventory.sale_price = 9
+        inventory.save()
+    line.refresh_from_db()
+    assert (line.unit_price, line.price_changed) == (9, True)
+
+
+def test_orders_only_take_the_requesters_cart(client, shopper, make_product, django_user_model):
+    inventory = make_product().inventories.order_by('pk').first()
+    cart_id = client.get('/api/cart/').data['id']
+    add_item(client, cart_id, inventory)
+
+    other = django_user_model.objects.create_user(email='other@example.com', password='password')
+    client.force_authenticate(other)
+    response = client.post('/api/order/', {'cart': cart_id, 'user': other.pk})
+    assert response.status_code == 400
+    assert models.CartItem.objects.filter(cart=cart_id).count() == 1
+    assert not models.Order.objects.exists()
+
+    client.force_authenticate(shopper)
+    response = client.post('/api/order/', {'cart': cart_id, 'user': shopper.pk})
+    assert response.status_code == 200
+    assert not models.Cart.objects.filter(pk=cart_id).exists()
@@ -0,0 +1,126 @@
+from inventory import models
+
+
+def test_anonymous_catalog_reads_are_served_from_cache(
+    client, make_product, django_user_model, django_assert_num_queries,
+    django_capture_on_commit_callbacks,
+):
+    product = make_product()
+    client.get('/api/products/')
+
+    with django_assert_num_queries(0):
+        response = client.get('/api/products/')
+    assert response.data['results'][0]['name'] == 'Shirt'
+
+    # ? authenticated readers share the body and get their own wishlist flag
+    user = django_user_model.objects.first()
+    wishlist = models.Wishlist.objects.create(user=user)
+    client.force_authenticate(user)
+    assert client.get('/api/products/').data['results'][0]['is_in_wishlist'] is False
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.post(
+            f'/api/wishlist/{wishlist.pk}/items/', {'product': product.pk, 'wishlist': wishlist.pk})
+    assert response.status_code == 201
+    response = client.get('/api/products/')
+    assert response.data['results'][0]['is_in_wishlist'] is True
+    # ? sparse bodies keep the id the flag is personalized by
+    response = client.get('/api/products/', {'fields': 'name,is_in_wishlist'})
+    assert response.data['results'][0]['is_in_wishlist'] is True
+    client.force_authenticate(None)
+    response = client.get('/api/products/')
+    assert response.data['results'][0]['is_in_wishlist'] is False
+    response = client.get('/api/products/', {'fields': 'name,is_in_wishlist'})
+    assert response.data['results'][0]['is_in_wishlist'] is False
+
+    with django_capture_on_commit_callbacks(execute=True):
+        product.name = 'Renamed'
+        product.save()
+    response = client.get('/api/products/')
+    assert response.data['results'][0]['name'] == 'Renamed'
+
+
+def test_product_detail_conditional_get(client, make_product, django_assert_num_queries, django_capture_on_commit_callbacks):
+    product = make_product()
+    url = f'/api/products/{product.slug}/'
+    response = client.get(url)
+    etag = response['ETag']
+    # ? a new review changes no timestamp, If-Modified-Since cannot be honoured
+    assert not response.has_header('Last-Modified')
+
+    with django_assert_num_queries(1):
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+    response = client.get(url, HTTP_IF_MODIFIED_SINCE='Sat, 01 Jan 2000 00:00:00 GMT')
+    assert response.status_code == 200
+
+    inventory = product.inventories.first()
+    inventory.sale_price = 5
+    inventory.save()
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200 and response['ETag'] != etag
+    etag = response['ETag']
+
+    # ? features and attributes carry no timestamp, their versions move the ETag
+    feature = models.ProductFeature.objects.get()
+    with django_capture_on_commit_callbacks(execute=True):
+        feature.feature_value = 'Linen'
+        feature.save()
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200 and response['ETag'] != etag
+
+
+def test_product_list_facets(client, make_product, catalog, django_assert_num_queries):
+    make_product('Shirt')
+    make_product('Blouse')
+    other = models.Brand.objects.create(name='Other')
+    models.Product.objects.filter(name='Blouse').update(brand=other)
+
+    response = client.get('/api/products/', {'facets': 'brand,category,price,rating'})
+    facets = response.data['facets']
+    assert [(brand['name'], brand['count']) for brand in facets['brand']] == [
+        ('Acme', 1), ('Other', 1)]
+    assert [(category['slug'], category['count']) for category in facets['category']] == [
+        (catalog['category'].slug, 2)]
+    assert facets['price'][0] == {'min': 0, 'max': 25, 'count': 2}
+    assert facets['rating'][3] == {'rating': 4, 'count': 2}
+
+    # ? the counts follow the filters, but not the page or the sort
+    response = client.get('/api/products/', {'facets': 'brand', 'brand': 'Other', 'sort': 'name'})
+    assert response.data['facets'] == {'brand': [{'id': other.pk, 'name': 'Other', 'count': 1}]}
+    with django_assert_num_queries(0):
+        response = client.get('/api/products/', {'facets': 'brand', 'brand': 'Other', 'sort': 'name'})
+    assert response.data['facets']['brand'][0]['count'] == 1
+
+
+def test_category_tree_served_from_one_query(client, catalog, django_assert_num_queries, django_capture_on_commit_callbacks):
+    with django_assert_num_queries(1):
+        response = client.get('/api/category/')
+    assert [category['slug'] for category in response.json()] == [
+        'clothing', 'shirts', 't-shirts']
+    with django_assert_num_queries(0):
+        response = client.get('/api/category/root/')
+    [clothing] = response.json()
+    assert clothing['children'][0]['children'][0]['name'] == 'T-Shirts'
+    assert client.get('/api/category/root/', HTTP_IF_NONE_MATCH=response['ETag']).status_code == 304
+
+    with django_capture_on_commit_callbacks(execute=True):
+        models.Category.objects.create(name='Hats')
+    assert [category['slug'] for category in client.get('/api/category/root/').json()] == [
+        'clothing', 'hats']
+
+
+def test_feature_and_attribute_edits_reach_cached_products(client, make_product, catalog, django_capture_on_commit_callbacks):
+    product = make_product()
+    url = f'/api/products/{product.slug}/'
+    assert 'Cotton' in str(client.get(url).data)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        catalog['feature'].feature_value = 'Linen'
+        catalog['feature'].save()
+    assert 'Linen' in str(client.get(url).data)
+
+    size = catalog['attribute_values'][0].product_attribute
+    with django_capture_on_commit_callbacks(execute=True):
+        size.name = 'Fit'
+        size.save()
+    assert 'Fit' in str(client.get(url).data)
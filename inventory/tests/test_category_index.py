@@ -0,0 +1,34 @@
+from inventory import models
+from inventory.category_index import category_index
+
+
+def test_category_index_ranges(catalog):
+    tree = category_index.get()
+    shirts = tree.get('shirts')
+    assert [node.slug for node in tree.subtree(tree.get('clothing'))] == [
+        'clothing', 'shirts', 't-shirts']
+    assert tree.descendant_ids(shirts, include_self=False) == [tree.get('t-shirts').id]
+    assert [node.slug for node in tree.ancestors(tree.get('t-shirts'))] == [
+        'clothing', 'shirts']
+    assert tree.get('missing') is None
+
+
+def test_products_filtered_by_category_subtree(client, make_product, catalog, django_capture_on_commit_callbacks):
+    shirt = make_product('Shirt')
+
+    def filtered(slug):
+        response = client.get('/api/products/', {'category': slug})
+        return [product['id'] for product in response.data['results']]
+
+    assert filtered('clothing') == [shirt.pk]
+    assert filtered('shirts') == [shirt.pk]
+    assert filtered('t-shirts') == []
+    assert filtered('missing') == []
+
+    # ? a new category reloads the index
+    with django_capture_on_commit_callbacks(execute=True):
+        trousers = models.Category.objects.create(
+            name='Trousers', parent=models.Category.objects.get(slug='clothing'))
+        shirt.category.add(trousers)
+    assert filtered('trousers') == [shirt.pk]
+    assert filtered('clothing') == [shirt.pk]
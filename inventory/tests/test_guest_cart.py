@@ -0,0 +1,99 @@
+from django.contrib.auth.signals import user_logged_in
+from django.core.cache import cache
+from inventory import models
+from inventory.guest_cart import guest_cart_key, new_guest_token
+
+
+def add_guest_item(client, inventory, token=None, quantity=1):
+    headers = {'HTTP_X_GUEST_CART': token} if token else {}
+    return client.post('/api/guest-cart/items/', {
+        'product_inventory': inventory.pk,
+        'attribute_values': [value.pk for value in inventory.attribute_values.all()],
+        'quantity': quantity,
+    }, format='json', **headers)
+
+
+def test_guest_cart_writes_nothing_until_merged(client, make_product, django_user_model, django_assert_num_queries):
+    first, second = make_product().inventories.order_by('pk')
+    token = add_guest_item(client, first).data['token']
+    response = add_guest_item(client, first, token, quantity=2)
+    assert (response.data['token'], response.data['items_count']) == (token, 1)
+    assert response.data['items'][0]['quantity'] == 3
+    add_guest_item(client, second, token)
+    assert not models.Cart.objects.exists()
+
+    with django_assert_num_queries(0):
+        response = client.get('/api/guest-cart/', HTTP_X_GUEST_CART=token)
+    assert response.data['cart_total_price'] == 3 * first.sale_price + second.sale_price
+
+    # ? a tampered token is no cart at all
+    assert client.get('/api/guest-cart/', HTTP_X_GUEST_CART=token + 'x').data['items'] == []
+
+    user = django_user_model.objects.create_user(email='guest@example.com', password='password')
+    client.force_authenticate(user)
+    response = client.post('/api/cart/merge/', HTTP_X_GUEST_CART=token)
+    assert [line['status'] for line in response.data['items']] == ['created', 'created']
+    cart = models.Cart.objects.get(user=user)
+    assert {(item.product_inventory_id, item.quantity) for item in cart.cart_items.all()} == {
+        (first.pk, 3), (second.pk, 1)}
+    assert client.post('/api/cart/merge/', HTTP_X_GUEST_CART=token).status_code == 404
+
+
+def test_guest_cart_merged_at_login(client, rf, make_product, django_user_model):
+    inventory = make_product().inventories.first()
+    token = add_guest_item(client, inventory, quantity=2).data['token']
+    user = django_user_model.objects.create_user(email='guest@example.com', password='password')
+
+    user_logged_in.send(
+        sender=user.__class__, request=rf.post('/', HTTP_X_GUEST_CART=token), user=user)
+    assert models.CartItem.objects.get(cart__user=user).quantity == 2
+
+
+def test_guest_lines_without_a_price_are_rejected(client, make_product):
+    inventory = make_product().inventories.first()
+    models.ProductInventory.objects.filter(pk=inventory.pk).update(sale_price=None)
+
+    response = add_guest_item(client, inventory)
+    assert response.status_code == 400
+    assert response.data['errors'][0]['detail'] == 'No price available.'
+
+
+def test_unmergeable_guest_cart_does_not_fail_login(client, rf, make_product, django_user_model):
+    inventory = make_product().inventories.first()
+    token = new_guest_token()
+    cache.set(guest_cart_key(token), {'line': {
+        'product_inventory': inventory.pk, 'attribute_values': [],
+        'unit_price': 'None', 'quantity': 1,
+    }})
+    user = django_user_model.objects.create_user(email='guest@example.com', password='password')
+
+    user_logged_in.send(
+        sender=user.__class__, request=rf.post('/', HTTP_X_GUEST_CART=token), user=user)
+    assert not models.CartItem.objects.filter(cart__user=user).exists()
+    assert cache.get(guest_cart_key(token))
+
+
+def test_guest_lines_take_the_sale_price(client, make_product):
+    inventory = make_product().inventories.first()
+    response = client.post('/api/guest-cart/items/', {
+        'product_inventory': inventory.pk,
+        'attribute_values': [value.pk for value in inventory.attribute_values.all()],
+        'quantity': 2,
+        'unit_price': '0.01',
+    }, format='json')
+    assert response.status_code == 201
+    assert response.data['items'][0]['unit_price'] == str(inventory.sale_price)
+    assert response.data['cart_total_price'] == 2 * inventory.sale_price
+
+
+def test_full_guest_cart_still_adds_to_its_lines(client, make_product, monkeypatch):
+    first, second = make_product().inventories.order_by('pk')
+    monkeypatch.setattr('inventory.views.GUEST_CART_MAX_LINES', 1)
+    token = add_guest_item(client, first).data['token']
+
+    response = add_guest_item(client, first, token)
+    assert response.status_code == 201
+    assert response.data['items'][0]['quantity'] == 2
+    response = add_guest_item(client, second, token)
+    assert response.status_code == 400
+    assert response.data['errors'][0]['detail'] == 'A guest cart holds at most 1 lines.'
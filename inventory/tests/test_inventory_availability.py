@@ -0,0 +1,28 @@
+from inventory import models
+
+
+def test_inventory_payload_carries_availability(client, make_product):
+    product = make_product()
+    inventory = product.inventories.order_by('pk').first()
+
+    response = client.get(f'/api/inventory/{inventory.sku}/')
+    assert response.data['available_units'] == 5
+
+
+def test_bulk_availability(client, make_product, django_assert_num_queries):
+    product = make_product(inventories=3)
+    first, second, third = product.inventories.order_by('pk')
+    models.Stock.objects.filter(product_inventory=second).update(units=0)
+    models.ProductInventory.objects.filter(pk=third.pk).update(is_active=False)
+
+    with django_assert_num_queries(1):
+        response = client.get('/api/inventory/availability/', {
+            'skus': f'{first.sku},{second.sku},{third.sku},unknown'})
+    assert response.data == {
+        'results': {
+            first.sku: {'available_units': 5, 'in_stock': True},
+            second.sku: {'available_units': 0, 'in_stock': False},
+            third.sku: {'available_units': 0, 'in_stock': False},
+        },
+        'missing': ['unknown'],
+    }
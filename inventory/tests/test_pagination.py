@@ -0,0 +1,48 @@
+import json
+from base64 import urlsafe_b64encode
+from inventory import models
+
+
+def walk(client, url, params, direction='next'):
+    pages = []
+    response = client.get(url, params)
+    while True:
+        assert response.status_code == 200
+        pages.append([product['id'] for product in response.data['results']])
+        if not response.data[direction]:
+            return pages
+        response = client.get(response.data[direction])
+
+
+def test_keyset_pages_follow_sort_with_ties_and_nulls(client, make_product):
+    products = [make_product(name=f'Shirt {index % 3}') for index in range(19)]
+    # ? ties on price, and a few products without any sale price
+    for index, product in enumerate(products):
+        price = None if index % 7 == 0 else index % 4
+        models.ProductInventory.objects.filter(
+            product=product).update(sale_price=price)
+
+    for sort, key in (
+        ('price', lambda p: (p.min_price is None, p.min_price or 0, p.pk)),
+        ('-name', lambda p: (-ord(p.name[-1]), p.pk)),
+    ):
+        expected = sorted(
+            models.Product.objects.with_listing_plan(()), key=key)
+        pages = walk(client, '/api/products/', {'sort': sort})
+        assert [pk for page in pages for pk in page] == [p.pk for p in expected]
+
+        # ? walking back from the last page gives the same pages in reverse
+        last_page = client.get('/api/products/', {'sort': sort})
+        while last_page.data['next']:
+            last_page = client.get(last_page.data['next'])
+        previous_pages = walk(client, last_page.data['previous'], {}, 'previous')
+        assert previous_pages == pages[-2::-1]
+
+
+def test_tampered_cursors_are_not_found(client, make_product):
+    make_product()
+    for position in (['garbage', 1], ['2021-09-01 10:20:30+00:00', 'x'], [{}, 1]):
+        cursor = urlsafe_b64encode(json.dumps({'p': position, 'r': 0}).encode()).decode()
+        response = client.get('/api/products/', {'cursor': cursor})
+        assert response.status_code == 404
+    assert client.get('/api/products/', {'cursor': 'not-base64!'}).status_code == 404
@@ -0,0 +1,57 @@
+from django.db import transaction
+from inventory import models
+from inventory.catalog_cache import get_versions
+
+
+def test_product_card_follows_catalog_writes(client, make_product, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        product = make_product()
+    card = models.ProductCard.objects.get(product=product)
+    assert (card.min_price, card.max_price) == (10, 11)
+    assert card.in_stock and card.category_path == 'Clothing > Shirts'
+    assert card.feature_image.name == 'product_images/shirt.jpg'
+
+    with django_capture_on_commit_callbacks(execute=True):
+        product.brand.name = 'Renamed'
+        product.brand.save()
+    assert models.ProductCard.objects.get(product=product).brand_name == 'Renamed'
+
+    with django_capture_on_commit_callbacks(execute=True):
+        product.is_active = False
+        product.save()
+    assert not models.ProductCard.objects.filter(product=product).exists()
+
+
+def test_product_list_serves_cards(client, make_product):
+    make_product()
+    models.ProductCard.objects.refresh()
+
+    response = client.get('/api/products/', {'view': 'card', 'sort': '-price'})
+    assert response.status_code == 200
+    assert response.data['results'][0]['default_sku'] is not None
+    assert response.data['results'][0]['total_rating'] == 1
+
+
+def test_catalog_refreshes_run_once_per_transaction(make_product, monkeypatch, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        product = make_product()
+    search_version = get_versions([models.ProductSearchDocument])
+    stocks = list(models.Stock.objects.filter(product_inventory__product=product))
+    refreshed = []
+    refresh = models.ProductCardQuerySet.refresh
+    monkeypatch.setattr(models.ProductCardQuerySet, 'refresh', lambda self, product_ids=None: (
+        refreshed.append(sorted(product_ids)), refresh(self, product_ids))[1])
+
+    with django_capture_on_commit_callbacks(execute=True):
+        with transaction.atomic():
+            for stock in stocks:
+                stock.units = 0
+                stock.save()
+            inventory = product.inventories.first()
+            inventory.sale_price = 3
+            inventory.save()
+    assert refreshed == [[product.pk]]
+    card = models.ProductCard.objects.get(product=product)
+    assert not card.in_stock and card.min_price == 3
+    # ? prices and stock are not indexed, the search documents stay as they are
+    assert get_versions([models.ProductSearchDocument]) == search_version
@@ -0,0 +1,90 @@
+from decimal import Decimal
+from inventory import models
+
+
+def prices(product):
+    product.refresh_from_db(fields=['min_price', 'max_price'])
+    return product.min_price, product.max_price
+
+
+def test_stored_prices_follow_inventory_writes(make_product):
+    product = make_product()
+    assert prices(product) == (10, 11)
+
+    inventory = product.inventories.get(sale_price=10)
+    inventory.sale_price = 30
+    inventory.save()
+    assert prices(product) == (11, 30)
+
+    models.ProductInventory.objects.filter(pk=inventory.pk).update(is_active=False)
+    assert prices(product) == (11, 11)
+
+    other = product.inventories.get(sale_price=11)
+    other.sale_price = Decimal('12.50')
+    models.ProductInventory.objects.bulk_update([other], ['sale_price'])
+    assert prices(product) == (Decimal('12.50'), Decimal('12.50'))
+
+    models.ProductInventory.objects.filter(pk=other.pk).delete()
+    assert prices(product) == (None, None)
+
+
+def test_stale_product_save_keeps_stored_prices(make_product):
+    product = make_product()
+    stale = models.Product.objects.get(pk=product.pk)
+    models.ProductInventory.objects.filter(product=product).update(sale_price=40)
+
+    stale.name = 'Renamed'
+    stale.save()
+    assert prices(product) == (40, 40)
+
+
+def test_price_filter_and_sort_use_stored_prices(client, make_product):
+    cheap = make_product('Cheap')
+    dear = make_product('Dear')
+    models.ProductInventory.objects.filter(product=dear).update(sale_price=100)
+
+    response = client.get('/api/products/', {'price_min': 50})
+    assert [item['id'] for item in response.data['results']] == [dear.pk]
+    response = client.get('/api/products/', {'sort': '-price'})
+    assert [item['id'] for item in response.data['results']] == [dear.pk, cheap.pk]
+
+
+def test_bulk_price_writes_reach_cached_and_derived_data(client, make_product, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        product = make_product()
+    url = f'/api/products/{product.slug}/'
+    assert client.get('/api/products/').data['results'][0]['min_price'] == '10.00'
+    assert client.get('/api/products/', {'view': 'card'}).data['results'][0]['min_price'] == '10.00'
+    etag = client.get(url)['ETag']
+
+    with django_capture_on_commit_callbacks(execute=True):
+        models.ProductInventory.objects.filter(product=product, sale_price=10).update(sale_price=3)
+    assert client.get('/api/products/').data['results'][0]['min_price'] == '3.00'
+    assert client.get('/api/products/', {'view': 'card'}).data['results'][0]['min_price'] == '3.00'
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200
+    product.refresh_from_db(fields=['variant_matrix'])
+    assert [price for _, price, _ in product.variant_matrix['variants'].values()] == ['3.00']
+
+
+def test_moved_variant_refreshes_both_products(make_product, catalog, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        source = make_product()
+        target = make_product('Hat', inventories=1)
+        moved = source.inventories.get(sale_price=10)
+        moved.attribute_values.add(models.ProductAttributeValue.objects.create(
+            product_attribute=catalog['attribute_values'][0].product_attribute, attribute_value='XL'))
+    assert 'XL' in models.ProductSearchDocument.objects.get(product=source).attributes
+
+    with django_capture_on_commit_callbacks(execute=True):
+        moved.sale_price = 5
+        moved.product = target
+        moved.save()
+    assert prices(source) == (11, 11)
+    assert prices(target) == (5, 10)
+    cards = {card.product_id: card for card in models.ProductCard.objects.all()}
+    assert (cards[source.pk].min_price, cards[target.pk].min_price) == (11, 5)
+    source.refresh_from_db(fields=['variant_matrix'])
+    assert [sku for sku, _, _ in source.variant_matrix['variants'].values()] == [
+        source.inventories.get().sku]
+    assert 'XL' not in models.ProductSearchDocument.objects.get(product=source).attributes
+    assert 'XL' in models.ProductSearchDocument.objects.get(product=target).attributes
@@ -0,0 +1,96 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from inventory.category_index import category_index
+
+# ! bump these only on purpose: every extra query here is paid on every page
+PRODUCT_LIST_QUERIES = 1
+PRODUCT_EXPANDED_LIST_QUERIES = 7
+PRODUCT_DETAIL_QUERIES = 8
+
+
+@pytest.fixture(autouse=True)
+def no_response_cache(settings):
+    # ? these count the queries of building a response, not of a cache hit
+    settings.CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+    }
+    # ? the category index is loaded by the first request that needs it
+    category_index.reset()
+
+
+def count_queries(client, url):
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+    assert response.status_code == 200
+    return len(queries)
+
+
+def test_product_list_queries_do_not_grow_with_page_size(client, make_product):
+    make_product()
+    one_product = count_queries(client, '/api/products/')
+
+    for index in range(7):
+        make_product(name=f'Shirt {index}')
+    full_page = count_queries(client, '/api/products/')
+
+    assert full_page == one_product
+
+
+def test_product_list_query_count(client, make_product, django_assert_num_queries):
+    for index in range(8):
+        make_product(name=f'Shirt {index}')
+
+    with django_assert_num_queries(PRODUCT_LIST_QUERIES):
+        response = client.get('/api/products/')
+    assert len(response.data['results']) == 8
+
+
+def test_expanded_product_list_query_count(client, make_product, catalog, django_assert_num_queries):
+    for index in range(8):
+        make_product(name=f'Shirt {index}')
+
+    with django_assert_num_queries(PRODUCT_EXPANDED_LIST_QUERIES):
+        response = client.get(
+            '/api/products/', {'expand': 'inventory,category,features'})
+    assert len(response.data['results'][0]['inventory']) == 2
+    assert response.data['results'][0]['category'] == [{
+        'id': catalog['category'].pk,
+        'name': 'Shirts',
+        'slug': 'shirts',
+        'breadcrumb': [{'id': catalog['category'].parent_id, 'name': 'Clothing', 'slug': 'clothing'}],
+    }]
+
+
+def test_product_list_sparse_fields(client, make_product):
+    make_product()
+
+    response = client.get(
+        '/api/products/', {'fields': 'id,name,inventory', 'expand': 'inventory'})
+    assert set(response.data['results'][0]) == {'id', 'name', 'inventory'}
+
+
+def test_product_detail_query_count(client, make_product, django_assert_num_queries):
+    product = make_product(inventories=4)
+
+    with django_assert_num_queries(PRODUCT_DETAIL_QUERIES):
+        response = client.get(f'/api/products/{product.slug}/')
+    assert response.data['total_rating'] == 1
+
+
+def test_bulk_lookup_query_count(client, make_product, django_assert_num_queries):
+    products = [make_product(name=f'Shirt {index}') for index in range(6)]
+    slugs = ','.join(product.slug for product in products[:3])
+    ids = ','.join(str(product.pk) for product in products[3:])
+
+    with django_assert_num_queries(PRODUCT_EXPANDED_LIST_QUERIES):
+        response = client.get('/api/products/lookup/', {
+            'slugs': f'{slugs},missing-slug',
+            'ids': f'{ids},0',
+            'expand': 'inventory,category,features',
+        })
+    assert [item['id'] for item in response.data['results']] == [product.pk for product in products]
+    assert response.data['missing'] == ['missing-slug', '0']
+
+    response = client.get('/api/products/lookup/', {'ids': ','.join(map(str, range(1, 52)))})
+    assert response.status_code == 400
@@ -0,0 +1,37 @@
+from inventory import models
+
+
+def test_rating_summary_follows_review_writes(make_product, django_user_model):
+    product = make_product()
+    user = django_user_model.objects.create_user(
+        email='second@example.com', password='password')
+
+    review = models.Review.objects.create(
+        user=user, product=product, comment='Meh', rating=2)
+    review.rating = 5
+    review.save()
+    product.refresh_from_db()
+    assert (product.rating_count, product.rating_sum) == (2, 9)
+    assert (product.rating_2_count, product.rating_4_count, product.rating_5_count) == (0, 1, 1)
+    assert product.rating_avg == 4.5
+
+    review.delete()
+    product.refresh_from_db()
+    assert (product.rating_count, product.rating_sum, product.rating_avg) == (1, 4, 4.0)
+
+    models.Product.objects.update(rating_count=0, rating_sum=0, rating_avg=0)
+    models.Product.objects.all().rebuild_rating_summary()
+    product.refresh_from_db()
+    assert (product.rating_count, product.rating_4_count, product.rating_avg) == (1, 1, 4.0)
+
+
+def test_bulk_review_delete_keeps_the_summary(make_product, django_user_model):
+    product = make_product()
+    user = django_user_model.objects.create_user(
+        email='second@example.com', password='password')
+    models.Review.objects.create(user=user, product=product, comment='Meh', rating=2)
+
+    models.Review.objects.filter(product=product, rating=4).delete()
+    product.refresh_from_db()
+    assert (product.rating_count, product.rating_sum, product.rating_avg) == (1, 2, 2.0)
+    assert (product.rating_2_count, product.rating_4_count) == (1, 0)
@@ -0,0 +1,86 @@
+import pytest
+from django.core.cache import cache
+from inventory import models
+from inventory.search import SearchIndex, catalog_search
+
+
+@pytest.fixture(autouse=True)
+def fresh_index():
+    catalog_search.reset()
+    yield
+    catalog_search.reset()
+
+
+def test_search_index_ranks_and_corrects_typos():
+    index = SearchIndex()
+    index.add(1, {'name': 'Linen shirt', 'description': 'Summer wear'})
+    index.add(2, {'name': 'Summer dress', 'description': 'Made of linen'})
+
+    assert [doc_id for doc_id, _ in index.search('linen')] == [1, 2]
+    assert [doc_id for doc_id, _ in index.search('summer')] == [2, 1]
+    assert [doc_id for doc_id, _ in index.search('shrit')] == [1]
+    assert index.search('shrit', typo_tolerance=False) == []
+
+    index.remove(1)
+    assert index.search('shirt') == []
+
+
+def test_product_search_follows_catalog_writes(client, make_product, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        shirt = make_product('Flannel shirt')
+        jumper = make_product('Wool jumper')
+
+    response = client.get('/api/products/', {'search': 'wool jumpr'})
+    assert [item['id'] for item in response.data['results']] == [jumper.pk]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        shirt.name = 'Linen shirt'
+        shirt.save()
+    assert models.ProductSearchDocument.objects.get(product=shirt).name == 'Linen shirt'
+    response = client.get('/api/products/', {'search': 'linen'})
+    assert [item['id'] for item in response.data['results']] == [shirt.pk]
+    assert client.get('/api/products/', {'search': 'flannel'}).data['results'] == []
+
+
+def test_deleted_products_leave_the_search_index(client, make_product, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        shirt = make_product('Flannel shirt')
+        make_product('Flannel jumper')
+    assert len(client.get('/api/products/', {'search': 'flannel'}).data['results']) == 2
+
+    with django_capture_on_commit_callbacks(execute=True):
+        shirt.reviews.all().delete()
+        shirt.delete()
+    assert [doc_id for doc_id, _ in catalog_search.search('flannel')] == [
+        models.Product.objects.get().pk]
+
+
+def test_search_results_are_capped_by_the_setting(client, make_product, settings, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        make_product('Flannel shirt')
+        make_product('Flannel jumper')
+
+    settings.SEARCH_RESULT_LIMIT = 1
+    assert len(client.get('/api/products/', {'search': 'flannel'}).data['results']) == 1
+    cache.clear()
+    settings.SEARCH_RESULT_LIMIT = None
+    assert len(client.get('/api/products/', {'search': 'flannel'}).data['results']) == 2
+
+
+def test_search_follows_type_feature_and_attribute_edits(make_product, catalog, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        product = make_product('Flannel shirt')
+    assert catalog_search.search('jumper') == []
+
+    with django_capture_on_commit_callbacks(execute=True):
+        catalog['product_type'].name = 'Jumper'
+        catalog['product_type'].save()
+        catalog['feature'].feature_value = 'Linen'
+        catalog['feature'].save()
+        value = catalog['attribute_values'][0]
+        value.attribute_value = 'Oversized'
+        value.save()
+        value.product_attribute.name = 'Cut'
+        value.product_attribute.save()
+    for query in ('jumper', 'linen', 'oversized', 'cut'):
+        assert [doc_id for doc_id, _ in catalog_search.search(query)] == [product.pk]
@@ -0,0 +1,26 @@
+from inventory import models
+
+
+def test_variant_matrix_follows_variants(client, make_product, catalog, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        product = make_product()
+    first, second = product.inventories.order_by('pk')
+    response = client.get(f'/api/products/{product.slug}/')
+    assert response.data['variant_matrix'] == {
+        'attributes': [['Colour', ['Red']], ['Size', ['M']]],
+        'variants': {'0:0': [first.sku, '10.00', 5]},
+    }
+
+    large = models.ProductAttributeValue.objects.create(
+        product_attribute=catalog['attribute_values'][0].product_attribute, attribute_value='L')
+    with django_capture_on_commit_callbacks(execute=True):
+        second.attribute_values.set([large, catalog['attribute_values'][1]])
+        models.Stock.objects.filter(product_inventory=second).update(units=0)
+        second.save()
+    product.refresh_from_db()
+    assert product.variant_matrix == {
+        'attributes': [['Colour', ['Red']], ['Size', ['L', 'M']]],
+        'variants': {'0:1': [first.sku, '10.00', 5], '0:0': [second.sku, '11.00', 0]},
+    }
+    response = client.get(f'/api/products/{product.slug}/')
+    assert response.data['variant_matrix'] == product.variant_matrix
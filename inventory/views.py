@@ -1,21 +1,34 @@
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
 from rest_framework.viewsets import ModelViewSet, GenericViewSet, mixins
 from inventory.serializers.wishlist_serializer import WishlistSerializer, WishlistItemSerializer, CreateWishlistItemSerializer
 from users.models import User
 from users.serializers import UserSerializer
 from inventory.serializers.order_serializer import OrderSerializer, OrderItemSerializer, CreateOrderSerializer
 from inventory.models import CartItem
-from inventory.serializers.cart_serializers import CartSerializer, CartItemSerializer, AddCartItemSerializer, UpdateCartItemSerializer
+from inventory.serializers.cart_serializers import (
+    CartSerializer, CartItemSerializer, AddCartItemSerializer, UpdateCartItemSerializer,
+    BulkAddCartItemSerializer, CartLineSerializer, resolve_cart_lines
+)
+from inventory.guest_cart import (
+    GUEST_CART_MAX_LINES, add_guest_line, get_guest_lines, get_guest_token, guest_cart_key,
+    guest_line_key, merge_guest_cart, new_guest_token, summarize_guest_cart
+)
 from inventory.serializers.review_serializer import ReviewSerializer
 from inventory import models
-from inventory.filters import ProductFilter
+from inventory.filters import ProductFilter, ProductSearchFilter
 from inventory.serializers.brand_serializer import BrandSerializer
-from inventory.serializers.category_serializer import CategorySerializer
+from inventory.serializers.category_serializer import CategorySerializer, serialize_category_forest
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.filters import SearchFilter
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.renderers import JSONRenderer
 # ! SERIALIZERS
-from inventory.serializers.product_serializer import ProductSerializer
+from inventory.serializers.product_serializer import ProductSerializer, ProductListSerializer
+from inventory.serializers.product_card_serializer import ProductCardSerializer
 from inventory.serializers.product_inventory_serializer import (
     ProductInventorySerializer
 )
@@ -25,63 +38,325 @@ from permissions import custom_permissions
 from permissions.assign_permissions import assign_permissions
 from rest_framework import permissions
 from rest_framework.pagination import PageNumberPagination
-from django.db.models import Min, Case, When, Value, Count, F
+from inventory.pagination import KeysetPagination
+from inventory.catalog_cache import (
+    CatalogCacheMixin, conditional_response, get_versions, versions_digest
+)
+from inventory.wishlist_cache import get_wishlist_product_ids, invalidate_wishlist
+from inventory.cart_cache import get_cart_items_count, set_cart_items_count
+from inventory.category_index import category_index
+from inventory.autocomplete import SUGGESTION_LIMIT, catalog_autocomplete
+from django.db.models import Max, Count, F, Q, Prefetch
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework import status
 
 
-class Products(ModelViewSet):
-    queryset = models.Product.objects.annotate(
-        min_price=Min('inventories__sale_price')).order_by('created_at').filter(is_active=True)
-    serializer_class = ProductSerializer
+class Products(CatalogCacheMixin, ModelViewSet):
+    queryset = models.Product.objects.with_listing_plan().order_by(
+        'created_at').filter(is_active=True)
     lookup_field = 'slug'
     permission_classes = [custom_permissions.IsAdminOrReadOnly]
+    pagination_class = KeysetPagination
     filterset_class = ProductFilter
     filter_backends = [
         DjangoFilterBackend,
-        SearchFilter
-    ]
-    search_fields = [
-        '$name',
-        '^brand__name',
-        '^product_type__name',
+        ProductSearchFilter
     ]
 
     ordering = ['-created_at']
+    cache_models = [
+        models.Product,
+        models.ProductInventory,
+        models.Media,
+        models.Stock,
+        models.Category,
+        models.Brand,
+        models.Review,
+        models.ProductSearchDocument,
+        models.ProductFeature,
+        models.ProductAttribute,
+        models.ProductAttributeValue,
+    ]
 
     def get_queryset(self):
-        request = self.request
-        if request.user and request.user.is_authenticated:
-            return models.Product.objects.all().annotate(
-                is_in_wishlist=Case(
-                    When(
-                        wishlistitem__wishlist__user=request.user,
-                        then=Value(True)
-                    ),
-                    default=Value(False)
-                ),
-                min_price=Min('inventories__sale_price')
-            ).order_by('created_at').filter(is_active=True)
+        # ! with_listing_plan() keeps list and detail at a fixed number of queries,
+        # ! the query is the same for every user: wishlist flags are applied
+        # ! from the user's cached wishlist ids during serialization
+        queryset = models.Product.objects.with_listing_plan(
+            self.get_relations()).order_by('created_at').filter(is_active=True)
+        # ? the variant matrix is only part of the detail payload
+        if self.action != 'retrieve':
+            queryset = queryset.defer('variant_matrix')
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action in ('list', 'lookup'):
+            return ProductListSerializer
+        return ProductSerializer
+
+    def get_requested_fields(self):
+        # ? ?fields=id,name,... limits the top level fields of the payload
+        fields = self.request.query_params.get('fields')
+        if not fields:
+            return None
+        fields = {field for field in fields.split(',') if field}
+        # ? personalize() finds the product of a cached wishlist flag by its id
+        if 'is_in_wishlist' in fields:
+            fields.add('id')
+        return fields
+
+    def get_relations(self):
+        # ! nested relations that will be serialized, and therefore prefetched:
+        # ! opt-in with ?expand= on the list, all of them on the detail
+        if self.action in ('list', 'lookup'):
+            expand = self.request.query_params.get('expand', '').split(',')
+            relations = set(expand) & set(models.PRODUCT_RELATIONS)
         else:
-            return models.Product.objects.all().annotate(
-                min_price=Min('inventories__sale_price')
-            ).order_by('created_at').filter(is_active=True)
+            relations = set(models.PRODUCT_RELATIONS)
+        fields = self.get_requested_fields()
+        return relations & fields if fields else relations
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.get_requested_fields()
+        context['expand'] = self.get_relations()
+        context['wishlist_product_ids'] = get_wishlist_product_ids(
+            self.request.user)
+        if 'category' in context['expand']:
+            context['category_tree'] = category_index.get()
+        return context
+
+    # ! ?view=card serves the listing straight from the ProductCard table,
+    # ! the product query only narrows it down to the filtered/searched ids
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('view') == 'card':
+            response = self.cached_response(request, self.list_cards)
+        else:
+            response = super().list(request, *args, **kwargs)
+        facets = self.get_requested_facets()
+        if facets and response.status_code == status.HTTP_200_OK:
+            response.data['facets'] = self.get_facets(request, facets)
+        return response
+
+    # ! FACETS
+    # ? query params that change the filtered product set, anything else
+    # ? (cursor, sort, fields, ...) leaves the facet counts untouched
+    facet_filter_params = ('category', 'brand', 'rating', 'price_min', 'price_max', 'search')
+
+    def get_requested_facets(self):
+        facets = self.request.query_params.get('facets', '').split(',')
+        return sorted(set(facets) & set(models.PRODUCT_FACETS))
+
+    def get_facets(self, request, facets):
+        # ! ?facets=brand,category,price,rating counts over the whole filtered
+        # ! set, cached per normalized filter combination and catalog versions
+        selection = []
+        for param in self.facet_filter_params:
+            value = request.query_params.get(param, '').strip()
+            if param == 'brand':
+                # ? a brand list selects the same products in any order
+                value = ','.join(sorted(set(value.split(','))))
+            if value:
+                selection.append((param, value))
+        versions = versions_digest(self.cache_models)
+        digest = hashlib.md5(str([facets, selection]).encode()).hexdigest()
+        key = f"catalog:facets:{digest}:{versions}"
+        counts = cache.get(key)
+        if counts is None:
+            counts = self.filter_queryset(self.get_queryset()).facet_counts(facets)
+            cache.set(key, counts, settings.CATALOG_CACHE_TIMEOUT)
+        return counts
+
+    # ! conditional GET on the detail: the ETag comes from one aggregate
+    # ! query, a matching If-None-Match answers 304 before the product is
+    # ! loaded or serialized.
+    # ? no Last-Modified: reviews, brands, categories and the wishlist flag
+    # ? feed the body without a timestamp, only the ETag covers them
+    def retrieve(self, request, *args, **kwargs):
+        etag = self.get_etag(request, kwargs[self.lookup_field])
+        if etag is None:
+            return super().retrieve(request, *args, **kwargs)
+        return conditional_response(
+            request, super().retrieve, etag, None, *args, **kwargs)
+
+    def get_etag(self, request, slug):
+        product = models.Product.objects.filter(
+            slug=slug, is_active=True
+        ).annotate(
+            inventories_updated_at=Max('inventories__updated_at'),
+            images_updated_at=Max('inventories__images__updated_at'),
+            inventories_count=Count('inventories', distinct=True),
+            images_count=Count('inventories__images', distinct=True),
+        ).values(
+            'pk',
+            'updated_at',
+            'inventories_updated_at',
+            'images_updated_at',
+            'inventories_count',
+            'images_count',
+            'rating_count',
+            'rating_sum',
+        ).first()
+        if product is None:
+            return None
+        # ? nested brand, categories, features and attributes have no
+        # ? timestamps of their own, their version counters stand in
+        validators = [*product.values(), *get_versions([
+            models.Category,
+            models.Brand,
+            models.ProductFeature,
+            models.ProductAttribute,
+            models.ProductAttributeValue,
+        ])]
+        if request.user and request.user.is_authenticated:
+            validators.append(
+                product['pk'] in get_wishlist_product_ids(request.user))
+        digest = hashlib.md5(str(validators).encode()).hexdigest()
+        return f'W/"{digest}"'
+
+    # ! cached bodies are shared by every user, the wishlist flag is set per user
+    def personalize(self, request, data):
+        if request.query_params.get('view') == 'card':
+            return data
+        fields = self.get_requested_fields()
+        if fields and 'is_in_wishlist' not in fields:
+            return data
+        wishlist = get_wishlist_product_ids(request.user)
+        for product in data['results'] if 'results' in data else [data]:
+            if 'id' in product and 'is_in_wishlist' in product:
+                product['is_in_wishlist'] = product['id'] in wishlist
+        return data
+
+    # ! BULK LOOKUP
+    # ! ?slugs=a,b,c and/or ?ids=1,2,3 in one response and one query plan, for
+    # ! pages (cart, wishlist, recently viewed) showing a known set of products
+    lookup_limit = 50
+
+    @action(detail=False, methods=['get'])
+    def lookup(self, request):
+        slugs, ids = self.get_lookup_keys(request)
+        if len(slugs) + len(ids) > self.lookup_limit:
+            raise ValidationError(
+                {'detail': f'At most {self.lookup_limit} products can be looked up at once.'})
+        return self.cached_response(request, self.lookup_products)
+
+    def get_lookup_keys(self, request):
+        def split(param):
+            return list(dict.fromkeys(
+                value.strip() for value in request.query_params.get(param, '').split(',') if value.strip()))
+        return split('slugs'), split('ids')
+
+    def lookup_products(self, request):
+        slugs, ids = self.get_lookup_keys(request)
+        numeric_ids = [int(value) for value in ids if value.isdigit()]
+        products = self.get_queryset().filter(
+            Q(slug__in=slugs) | Q(pk__in=numeric_ids))
+        by_slug = {}
+        by_id = {}
+        for product in products:
+            by_slug[product.slug] = by_id[str(product.pk)] = product
+        # ? results follow the order of the request, unknown keys are reported
+        results, missing = [], []
+        for key, found in [*((slug, by_slug) for slug in slugs), *((pk, by_id) for pk in ids)]:
+            product = found.get(key)
+            if product is None:
+                missing.append(key)
+            elif product not in results:
+                results.append(product)
+        serializer = self.get_serializer(results, many=True)
+        return Response({'results': serializer.data, 'missing': missing})
+
+    # ! type-ahead for the search box: ?q=<prefix>&limit=<n> answered from the
+    # ! in-memory prefix index, no query runs unless the catalog has changed
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        try:
+            limit = min(int(request.query_params.get('limit', SUGGESTION_LIMIT)), SUGGESTION_LIMIT)
+        except ValueError:
+            limit = SUGGESTION_LIMIT
+        prefix = request.query_params.get('q', '')
+        return Response(catalog_autocomplete.suggest(prefix, max(limit, 1)))
+
+    # ? maps ProductFilter's sort values onto ProductCard columns
+    card_ordering_fields = {
+        'name': 'name',
+        'price': 'min_price',
+    }
+
+    def list_cards(self, request):
+        products = self.filter_queryset(self.get_queryset())
+        ordering = []
+        for value in request.query_params.get('sort', '').split(','):
+            field = self.card_ordering_fields.get(value.lstrip('-'))
+            if field:
+                ordering.append(f"-{field}" if value.startswith('-') else field)
+        cards = models.ProductCard.objects.filter(
+            product__in=products.values('pk')
+        ).order_by(*(ordering or ['created_at']))
+        page = self.paginate_queryset(cards)
+        serializer = ProductCardSerializer(
+            page, many=True, context={'request': request})
+        return self.get_paginated_response(serializer.data)
 
 
 class ProductInventory(ModelViewSet):
-    queryset = models.ProductInventory.objects.filter(is_active=True)
+    # ! stock is joined for the available_units of the payload
+    queryset = models.ProductInventory.objects.filter(
+        is_active=True
+    ).select_related('stock').prefetch_related(
+        'images',
+        Prefetch(
+            'attribute_values',
+            queryset=models.ProductAttributeValue.objects.select_related('product_attribute')
+        ),
+    )
     serializer_class = ProductInventorySerializer
     permission_classes = [custom_permissions.IsAdminOrReadOnly]
     pagination_class = PageNumberPagination
     lookup_field = 'sku'
     # filterset_class = ProductInventoryFilter
+    availability_limit = 100
 
-
-class Category(ModelViewSet):
+    # ! ?skus=a,b,c -> available units of every sku from a single query,
+    # ! unknown skus are reported in `missing`
+    @action(detail=False, methods=['get'])
+    def availability(self, request):
+        skus = list(dict.fromkeys(
+            sku.strip() for sku in request.query_params.get('skus', '').split(',') if sku.strip()))
+        if len(skus) > self.availability_limit:
+            raise ValidationError(
+                {'detail': f'At most {self.availability_limit} skus can be checked at once.'})
+        inventories = {
+            inventory.sku: inventory
+            for inventory in models.ProductInventory.objects.filter(
+                sku__in=skus).select_related('stock').only('sku', 'is_active', 'stock__units')
+        }
+        results = {}
+        for sku in skus:
+            if sku in inventories:
+                available = inventories[sku].available_units
+                results[sku] = {'available_units': available, 'in_stock': available > 0}
+        return Response({
+            'results': results,
+            'missing': [sku for sku in skus if sku not in inventories],
+        })
+
+
+class Category(CatalogCacheMixin, ModelViewSet):
     queryset = models.Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [custom_permissions.IsAdminOrReadOnly]
     lookup_field = 'slug'
     pagination_class = None
+    cache_models = [models.Category]
+
+    # ! the category tree is validated by its version counter alone
+    def get_tree_etag(self):
+        return f'W/"category-{get_versions([models.Category])[0]}"'
+
+    def list(self, request, *args, **kwargs):
+        return conditional_response(
+            request, self.tree_response, self.get_tree_etag(), None, 'categories')
 
     # ! this is the only way to get the root categories
     # ! detail is false because we are not getting a single category
@@ -89,21 +364,37 @@ class Category(ModelViewSet):
     # ! slug param
     @action(detail=False, methods=['get'])
     def root(self, request):
-        queryset = self.get_queryset().filter(parent=None)
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        return conditional_response(
+            request, self.tree_response, self.get_tree_etag(), None, 'roots')
+
+    # ! the list and root payloads are rendered once per category version
+    # ! from a single query and served as prebuilt JSON
+    def tree_response(self, request, scope):
+        key = f"catalog:category-tree:{get_versions([models.Category])[0]}"
+        blobs = cache.get(key)
+        if blobs is None:
+            roots, categories = serialize_category_forest()
+            renderer = JSONRenderer()
+            blobs = {
+                'roots': renderer.render(roots),
+                'categories': renderer.render(categories),
+            }
+            cache.set(key, blobs, settings.CATALOG_CACHE_TIMEOUT)
+        return HttpResponse(blobs[scope], content_type='application/json')
 
 
-class Brand(ModelViewSet):
+class Brand(CatalogCacheMixin, ModelViewSet):
     queryset = models.Brand.objects.all()
     serializer_class = BrandSerializer
     permission_classes = [custom_permissions.IsAdminOrReadOnly]
     pagination_class = None
+    cache_models = [models.Brand]
 
 
 class ReviewView(ModelViewSet):
     queryset = models.Review.objects.all()
     serializer_class = ReviewSerializer
+    pagination_class = KeysetPagination
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['rating']
     permission_classes = [custom_permissions.IsAuthenticatedAndIsObjectOwner]
@@ -145,14 +436,66 @@ class CartView(
         custom_permissions.CreateForMyAccount
     ]
     pagination_class = None
-    http_method_names = ['get']
+    http_method_names = ['get', 'post']
 
     def list(self, request, *args, **kwargs):
-        cart, created = self.get_queryset().get_or_create(user=request.user)
-        print('HERE', cart)
+        # ! one query for the cart and its totals, nothing is written on a
+        # ! read: without a cart the empty summary carries the id the first
+        # ! added item will create it under
+        cart = models.Cart.objects.with_summary().filter(user=request.user).first()
+        if cart is None:
+            cart = models.Cart(
+                id=models.Cart.id_for_user(request.user.pk), user=request.user, created_at=None)
+            cart.items_count, cart.cart_total_price, cart.price_changes_count = 0, 0, 0
+        set_cart_items_count(request.user.pk, cart.items_count)
         serializer = CartSerializer(cart)
         return Response(data=serializer.data, status=status.HTTP_200_OK)
 
+    # ! the item count for the cart badge, from the cache
+    @action(detail=False, methods=['get'])
+    def count(self, request):
+        return Response({'items_count': get_cart_items_count(request.user)})
+
+    # ! moves the guest cart of the X-Guest-Cart token into the user's cart,
+    # ! logging in with the header set does the same
+    @action(detail=False, methods=['post'])
+    def merge(self, request):
+        results = merge_guest_cart(request.user, get_guest_token(request))
+        if results is None:
+            raise NotFound('Guest cart not found.')
+        return Response({'items': results}, status=status.HTTP_200_OK)
+
+
+class GuestCartView(GenericViewSet):
+    # ! cart of an anonymous shopper, held in the cache under the signed
+    # ! X-Guest-Cart token: reading and adding never write to the database
+    permission_classes = [permissions.AllowAny]
+    serializer_class = CartLineSerializer
+    pagination_class = None
+
+    def list(self, request):
+        token = get_guest_token(request)
+        return Response(summarize_guest_cart(token, get_guest_lines(token)))
+
+    @action(detail=False, methods=['post'])
+    def items(self, request):
+        serializer = CartLineSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # ! guests always pay the current sale price, a unit_price sent by
+        # ! the client is ignored
+        [line] = resolve_cart_lines([dict(serializer.validated_data, unit_price=None)])
+        if 'errors' in line:
+            raise ValidationError(line['errors'])
+        token = get_guest_token(request)
+        if guest_cart_key(token) is None:
+            token = new_guest_token()
+        lines = get_guest_lines(token)
+        # ? more of a line already in a full cart is still fine
+        if guest_line_key(line['key']) not in lines and len(lines) >= GUEST_CART_MAX_LINES:
+            raise ValidationError(f'A guest cart holds at most {GUEST_CART_MAX_LINES} lines.')
+        lines = add_guest_line(token, line['key'], line['quantity'])
+        return Response(summarize_guest_cart(token, lines), status=status.HTTP_201_CREATED)
+
 
 class CartItemView(ModelViewSet):
 
@@ -163,7 +506,11 @@ class CartItemView(ModelViewSet):
     def get_queryset(self):
         # ! getting only items of a particular cart.
         # ? checkout to django extension implementation as well
-        return CartItem.objects.filter(cart=self.kwargs['cart_pk'], cart__user=self.request.user)
+        queryset = CartItem.objects.filter(
+            cart=self.kwargs['cart_pk'], cart__user=self.request.user)
+        if self.request.method == 'GET':
+            queryset = queryset.with_details()
+        return queryset
 
     def get_serializer_class(self):
         if (self.request.method == 'POST'):
@@ -178,6 +525,22 @@ class CartItemView(ModelViewSet):
             'cart_pk': self.kwargs['cart_pk']
         }
 
+    def create(self, request, *args, **kwargs):
+        # ? the first add creates the cart, items only go into the user's own
+        if models.Cart.objects.for_writing(request.user, self.kwargs['cart_pk']) is None:
+            raise NotFound('Cart not found.')
+        return super().create(request, *args, **kwargs)
+
+    # ! many lines in one request, each one reported with its own status
+    @action(detail=False, methods=['post'])
+    def bulk(self, request, cart_pk=None):
+        if models.Cart.objects.for_writing(request.user, cart_pk) is None:
+            raise NotFound('Cart not found.')
+        serializer = BulkAddCartItemSerializer(
+            data=request.data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        return Response({'items': serializer.save()}, status=status.HTTP_200_OK)
+
 
 class ShippingAddressView(ModelViewSet):
     queryset = ShippingAddress.objects.all()
@@ -199,6 +562,7 @@ class OrderView(ModelViewSet):
     permission_classes = [permissions.IsAuthenticated,
                           custom_permissions.CreateForMyAccount]
     http_method_names = ['post', 'get', 'delete']
+    pagination_class = KeysetPagination
     assign_perms = [
         'inventory.delete_orderitem',
         'inventory.view_orderitem',
@@ -293,6 +657,11 @@ class WishlistItemView(ModelViewSet):
         else:
             return WishlistItemSerializer
 
+    def perform_destroy(self, instance):
+        instance.delete()
+        user_id = self.request.user.pk
+        transaction.on_commit(lambda: invalidate_wishlist(user_id))
+
     # def create(self, request, *args, **kwargs):
     #     try:
     #         print('TRY BLOCK')
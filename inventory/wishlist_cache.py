@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.cache import cache
+from inventory import models
+
+
+# ! the product ids on a user's wishlist, held in the cache so product
+# ! listings can flag them without joining WishlistItem into the product query
+
+def wishlist_cache_key(user_id):
+    return f"wishlist:product_ids:{user_id}"
+
+
+def get_wishlist_product_ids(user):
+    if not (user and user.is_authenticated):
+        return set()
+    key = wishlist_cache_key(user.pk)
+    product_ids = cache.get(key)
+    if product_ids is None:
+        product_ids = set(models.WishlistItem.objects.filter(
+            wishlist__user=user).values_list('product_id', flat=True))
+        cache.set(key, product_ids, settings.WISHLIST_CACHE_TIMEOUT)
+    return product_ids
+
+
+def invalidate_wishlist(user_id):
+    cache.delete(wishlist_cache_key(user_id))
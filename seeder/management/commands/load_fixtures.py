@@ -18,3 +18,9 @@ class Command(BaseCommand):
             'loaddata', 'db_productinventory_attribute_values_fixture.json')
         call_command('loaddata', 'db_media_fixture.json')
         call_command('loaddata', 'db_stock_fixture.json')
+        # ? loaddata skips the model hooks that maintain these
+        call_command('rebuild_rating_summaries')
+        call_command('rebuild_product_prices')
+        call_command('rebuild_variant_matrices')
+        call_command('rebuild_product_cards')
+        call_command('rebuild_search_index')
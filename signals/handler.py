@@ -1,9 +1,329 @@
+import logging
+from django.db import transaction
+from django.utils import timezone
 from django.dispatch import receiver
-from django.db.models.signals import post_save
-from inventory.models import OrderItem
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from mptt.signals import node_moved
+from django.contrib.auth.signals import user_logged_in
+from inventory.cart_cache import invalidate_cart, invalidate_inventory_attributes
+from inventory.guest_cart import get_guest_token, merge_guest_cart
+from inventory.models import (
+    Brand,
+    Cart,
+    CartItem,
+    Category,
+    Media,
+    OrderItem,
+    Product,
+    ProductAttribute,
+    ProductAttributeValue,
+    ProductFeature,
+    ProductInventory,
+    ProductSearchDocument,
+    ProductType,
+    Review,
+    Stock,
+    queue_catalog_refresh,
+)
+
+
+logger = logging.getLogger(__name__)
 
 
 @receiver(post_save, sender=OrderItem)
 def order_cancelled_signal(sender, instance,  **kwargs):
     if instance.status == 'cancelled':
         print(f'=======================>>>>ORDER {instance.pk} CANCELLED')
+
+
+# ! CART BADGE
+# ? cached item counts are dropped once the write is committed
+@receiver([post_save, post_delete], sender=CartItem)
+def cart_item_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        for user_id in Cart.objects.filter(pk=instance.cart_id).values_list('user_id', flat=True):
+            transaction.on_commit(lambda user_id=user_id: invalidate_cart(user_id))
+
+
+@receiver(post_delete, sender=Cart)
+def cart_deleted(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_cart(instance.user_id))
+
+
+# ? attribute sets changed outside AddCartItemSerializer (admin, shell) keep
+# ? the stored signature of their lines canonical
+@receiver(m2m_changed, sender=CartItem.attribute_values.through)
+def cart_item_attributes_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    items = CartItem.objects.filter(pk__in=pk_set) if reverse else [instance]
+    for item in items:
+        signature = CartItem.signature_for(
+            item.attribute_values.values_list('pk', flat=True))
+        if signature != item.attribute_signature:
+            item.attribute_signature = signature
+            CartItem.objects.filter(pk=item.pk).update(attribute_signature=signature)
+
+
+# ? the attribute ids cached for add-to-cart validation follow the M2M
+@receiver(m2m_changed, sender=ProductInventory.attribute_values.through)
+def inventory_attributes_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action not in ('post_add', 'post_remove', 'post_clear'):
+            return
+        inventory_ids = [instance.pk]
+    elif action in ('post_add', 'post_remove'):
+        inventory_ids = list(pk_set)
+    elif action == 'pre_clear':
+        # ? the inventories of a cleared attribute value are only known before
+        inventory_ids = list(instance.inventory_attributes.values_list('pk', flat=True))
+    else:
+        return
+    transaction.on_commit(lambda: invalidate_inventory_attributes(inventory_ids))
+
+
+# ? a shopper logging in with their guest cart token keeps its lines
+@receiver(user_logged_in)
+def merge_guest_cart_on_login(sender, request, user, **kwargs):
+    token = get_guest_token(request) if request is not None else None
+    if not token:
+        return
+    # ! a guest cart that cannot be merged must never fail the login, it
+    # ! stays in the cache for an explicit POST cart/merge
+    try:
+        with transaction.atomic():
+            merge_guest_cart(user, token)
+    except Exception:
+        logger.exception('Could not merge the guest cart of user %s at login', user.pk)
+
+
+# ! DERIVED PRODUCT DATA
+# ? the receivers below only queue product ids, the cards, variant matrices
+# ? and search documents are rebuilt once per transaction when it commits (see
+# ? inventory.models.queue_catalog_refresh), so cascading deletes and
+# ? multi-step writes are seen in their final state and a transaction saving
+# ? many rows of one product rebuilds it once
+def refresh_product_cards(product_ids):
+    queue_catalog_refresh(product_ids, ['card'])
+
+
+def refresh_variant_matrix(product_ids):
+    queue_catalog_refresh(product_ids, ['variant_matrix'])
+
+
+def refresh_search_documents(product_ids):
+    queue_catalog_refresh(product_ids, ['search_document'])
+
+
+@receiver(post_save, sender=ProductInventory)
+def product_inventory_saved(sender, instance, raw=False, created=False, **kwargs):
+    if raw:
+        return
+    previous = None if created else getattr(instance, 'previous_state', None)
+    if previous is None:
+        queue_catalog_refresh([instance.product_id])
+        return
+    # ? a variant moved to another product leaves the old one stale as well
+    product_ids = {instance.product_id, previous['product_id']}
+    refreshes = ['card', 'variant_matrix']
+    # ? the search document only indexes the attributes of active variants
+    if (previous['product_id'], previous['is_active']) != (instance.product_id, instance.is_active):
+        refreshes.append('search_document')
+    queue_catalog_refresh(product_ids, refreshes)
+
+
+@receiver(post_delete, sender=ProductInventory)
+def product_inventory_deleted(sender, instance, **kwargs):
+    queue_catalog_refresh([instance.product_id])
+
+
+@receiver([post_save, post_delete], sender=Stock)
+def stock_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        queue_catalog_refresh(ProductInventory.objects.filter(
+            pk=instance.product_inventory_id).values_list('product_id', flat=True),
+            ['card', 'variant_matrix'])
+
+
+@receiver(post_save, sender=Product)
+def product_card_product_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_product_cards([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Review)
+def product_card_review_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_product_cards([instance.product_id])
+
+
+@receiver([post_save, post_delete], sender=Media)
+def product_card_media_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_product_cards(ProductInventory.objects.filter(
+            pk=instance.product_inventory_id).values_list('product_id', flat=True))
+
+
+@receiver(post_save, sender=Category)
+def product_card_category_saved(sender, instance, raw=False, **kwargs):
+    # ? a renamed category changes the path of every product below it
+    if not raw:
+        refresh_product_cards(Product.objects.filter(
+            category__in=instance.get_descendants(include_self=True)
+        ).values_list('pk', flat=True).distinct())
+
+
+@receiver(post_save, sender=Brand)
+def product_card_brand_saved(sender, instance, raw=False, **kwargs):
+    # ? a renamed brand changes the brand_name of all of its products
+    if not raw:
+        refresh_product_cards(Product.objects.filter(
+            brand=instance).values_list('pk', flat=True))
+
+
+@receiver(m2m_changed, sender=Product.category.through)
+def product_card_categories_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        refresh_product_cards([instance.pk])
+    elif pk_set:
+        refresh_product_cards(pk_set)
+
+
+# ! VARIANT MATRIX
+@receiver(post_save, sender=ProductAttributeValue)
+def variant_matrix_attribute_value_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_variant_matrix(ProductInventory.objects.filter(
+            attribute_values=instance).values_list('product_id', flat=True).distinct())
+
+
+@receiver(m2m_changed, sender=ProductInventory.attribute_values.through)
+def variant_matrix_attributes_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            refresh_variant_matrix([instance.product_id])
+        elif pk_set:
+            refresh_variant_matrix(ProductInventory.objects.filter(
+                pk__in=pk_set).values_list('product_id', flat=True))
+
+
+# ! SEARCH DOCUMENTS
+# ? only documents whose text changed are rewritten, and only then is the
+# ? version bumped that makes every process pull them into its search index
+@receiver(post_save, sender=Product)
+def search_document_product_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_search_documents([instance.pk])
+
+
+@receiver(post_save, sender=Brand)
+def search_document_brand_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_search_documents(Product.objects.filter(
+            brand=instance).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=ProductType)
+def search_document_product_type_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_search_documents(Product.objects.filter(
+            product_type=instance).values_list('pk', flat=True))
+
+
+# ? deletes are caught before the m2m rows cascade away with the instance,
+# ? while the products it was indexed under can still be found
+@receiver([post_save, pre_delete], sender=ProductFeature)
+def search_document_feature_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_search_documents(Product.objects.filter(
+            features=instance).values_list('pk', flat=True))
+
+
+@receiver([post_save, pre_delete], sender=ProductAttributeValue)
+def search_document_attribute_value_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_search_documents(Product.objects.filter(
+            inventories__attribute_values=instance).values_list('pk', flat=True).distinct())
+
+
+@receiver(post_save, sender=ProductAttribute)
+def search_document_attribute_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_search_documents(Product.objects.filter(
+            inventories__attribute_values__product_attribute=instance
+        ).values_list('pk', flat=True).distinct())
+
+
+# ? a product delete cascades to its document, searches drop it on sync
+@receiver(post_delete, sender=ProductSearchDocument)
+def search_document_deleted(sender, instance, **kwargs):
+    queue_catalog_refresh(versions=[ProductSearchDocument])
+
+
+@receiver(m2m_changed, sender=Product.features.through)
+def search_document_features_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            refresh_search_documents([instance.pk])
+        elif pk_set:
+            refresh_search_documents(pk_set)
+
+
+@receiver(m2m_changed, sender=ProductInventory.attribute_values.through)
+def search_document_attributes_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            refresh_search_documents([instance.product_id])
+        elif pk_set:
+            refresh_search_documents(ProductInventory.objects.filter(
+                pk__in=pk_set).values_list('product_id', flat=True))
+
+
+# ! CATALOG CACHE VERSIONS
+# ? bumped on commit by the same refresh as the derived data above, after
+# ? it, so no response gets cached under the new version with stale cards
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=ProductInventory)
+@receiver([post_save, post_delete], sender=Media)
+@receiver([post_save, post_delete], sender=Stock)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Brand)
+@receiver([post_save, post_delete], sender=Review)
+@receiver([post_save, post_delete], sender=ProductFeature)
+@receiver([post_save, post_delete], sender=ProductAttribute)
+@receiver([post_save, post_delete], sender=ProductAttributeValue)
+def catalog_model_changed(sender, **kwargs):
+    queue_catalog_refresh(versions=[sender])
+
+
+# ? moving a node rewrites lft/rght of whole subtrees through queryset
+# ? updates, the in-memory category index must be reloaded as well
+@receiver(node_moved, sender=Category)
+def category_moved(sender, **kwargs):
+    queue_catalog_refresh(versions=[Category])
+
+
+# ? m2m links have no timestamp of their own, touching updated_at on the owner
+# ? keeps the conditional GET validators of Products.retrieve honest
+def touch_updated_at(model, instance, reverse, pk_set):
+    owner_ids = pk_set if reverse else [instance.pk]
+    if owner_ids:
+        model.objects.filter(pk__in=owner_ids).update(
+            updated_at=timezone.now())
+
+
+@receiver(m2m_changed, sender=Product.category.through)
+@receiver(m2m_changed, sender=Product.features.through)
+def catalog_product_relation_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        touch_updated_at(Product, instance, reverse, pk_set)
+        queue_catalog_refresh(versions=[Product])
+
+
+@receiver(m2m_changed, sender=ProductInventory.attribute_values.through)
+def catalog_inventory_relation_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        touch_updated_at(ProductInventory, instance, reverse, pk_set)
+        queue_catalog_refresh(versions=[ProductInventory])
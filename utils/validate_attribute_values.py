@@ -1,6 +1,7 @@
-def validate_attribute_values(chosen_attribute, product_inventory):
-    inventory_attribute_values = product_inventory.attribute_values.all()
-    if (chosen_attribute in inventory_attribute_values):
-        return True
-    else:
-        return False
+def validate_attribute_values(chosen_attributes, valid_attribute_ids):
+    # ! the chosen attribute values the inventory does not carry, compared as
+    # ! a set against its attribute value ids (see get_inventory_attribute_ids)
+    return [
+        chosen_attribute for chosen_attribute in chosen_attributes
+        if chosen_attribute.pk not in valid_attribute_ids
+    ]